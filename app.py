@@ -1,6 +1,5 @@
-from PIL import Image
-import io
 import base64
+import hashlib
 
 
 ### ENVIRONMENT HANDLING
@@ -9,52 +8,111 @@ load_dotenv()
 import os
 
 ### APP IMPORTS
-from flask import Flask, jsonify
+from flask import Flask, jsonify, request, Response, make_response
 import json
+import time
 import sqlite3
+import compact_store
+import regions
+import sql_guard
+# "sqlite" queries app.db; "duckdb" queries its Parquet export (python columnar.py export app.db parquet)
+ANALYSE_BACKEND = os.getenv("ANALYSE_BACKEND", "sqlite")
+
 def connect_db():
     conn = sqlite3.connect('app.db',timeout=5)
+    # f32_* decoders, needed when app.db is in the packed compact layout
+    compact_store.register_functions(conn)
     return conn
 
-### EXA API
-from exa_py import Exa
-exa_api = os.getenv("EXA_API_KEY")
-exa = Exa(api_key = exa_api)
-from openai import OpenAI
-client = OpenAI(
-    base_url = "https://api.exa.ai",
-    api_key = exa_api,
-)
+### SERVICE CLIENTS
+# Exa, OpenAI, Daytona and Replicate clients are built on first use, see services.py
+import services
+
+### RETRIEVAL CACHE
+from retrieval import RetrievalCache, make_backend, WEB_TTL_S, RESEARCH_TTL_S
+retrieval_cache = RetrievalCache()
+retrieval_backend = make_backend(lambda: services.get("exa"))
 
-### DAYTONA API 
-from daytona import Daytona, DaytonaConfig, SessionExecuteRequest
-config = DaytonaConfig(api_key=os.getenv("DAYTONA_API_KEY"))
-daytona = Daytona(config)
+### PLOT STORE
+# Rendered plots keyed by hash of (SQL result, plot code); Viz code keyed by (prompt, columns)
+from plot_store import PlotStore, plot_key
+plot_store = PlotStore()
+VIZ_TTL_S = float(os.getenv("VIZ_CACHE_TTL_S", 24 * 3600))
+img_key = None
 
-### REPLICATE API 
-import replicate
-REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
+### SESSIONS
+# Turn history, rolling summary and recent analyse results per conversation, see sessions.py
+import sessions
+import threading
+session_store = sessions.SessionStore()
+
+### LOCAL VECTOR INDEX
+VECTOR_TOP_K = int(os.getenv("VECTOR_TOP_K", 4))
 
-### LANGGRAPH IMPORT
-from langgraph.graph import StateGraph, START, END
 from typing import TypedDict
 
+### INSTRUMENTATION
+import metrics
+
 ### AGENT-HEAD CLASS
+import queue
+
+class DeadlineExceeded(Exception):
+    """A generation cut short by the deadline; its partial text must not be used."""
+    def __init__(self, agent, partial):
+        super().__init__(f"{agent}: deadline hit after {len(partial)} chars")
+        self.partial = partial
+
 class TextAgent():
-    def __init__(self, model_name, system_prompt):
+    def __init__(self, model_name, system_prompt, name=None):
         self.model_name = model_name
         self.system_prompt = system_prompt
-    def gen(self, prompt):
+        self.name = name or model_name
+    def gen(self, prompt, deadline=None, system_prompt=None):
+        system_prompt = system_prompt or self.system_prompt
         input = {
             "prompt": prompt,
-            "system_prompt": self.system_prompt
+            "system_prompt": system_prompt
         }
         x = ''
-        for event in replicate.stream(
-            self.model_name,
-            input=input
-        ):
-            x+=str(event)
+        t0 = time.perf_counter()
+        first = True
+        # read on a worker thread, so a stalled stream cannot hold the caller past the deadline
+        events = queue.Queue()
+        def pump():
+            try:
+                for event in services.get("replicate").stream(
+                    self.model_name,
+                    input=input
+                ):
+                    events.put(str(event))
+                events.put(None)
+            except Exception as e:
+                events.put(e)
+        threading.Thread(target=pump, daemon=True).start()
+        while True:
+            try:
+                if deadline is None:
+                    event = events.get()
+                elif deadline - time.monotonic() > 0:
+                    event = events.get(timeout=deadline - time.monotonic())
+                else:
+                    raise queue.Empty
+            except queue.Empty:
+                metrics.LLM_SECONDS.observe(time.perf_counter() - t0, agent=self.name)
+                metrics.LLM_TRUNCATED_CHARS.observe(len(x), agent=self.name)
+                raise DeadlineExceeded(self.name, x)
+            if event is None:
+                break
+            if isinstance(event, Exception):
+                raise event
+            if first:
+                metrics.LLM_TTFT_SECONDS.observe(time.perf_counter() - t0, agent=self.name)
+                first = False
+            x+=event
+        metrics.LLM_SECONDS.observe(time.perf_counter() - t0, agent=self.name)
+        metrics.LLM_PROMPT_CHARS.observe(len(str(prompt)) + len(system_prompt), agent=self.name)
+        metrics.LLM_RESPONSE_CHARS.observe(len(x), agent=self.name)
         return x
 
 ### AGENT-HEADS
@@ -99,6 +157,7 @@ Router = TextAgent(
     2. web: search web.
     3. research: call the research model.
     4. analyse: call the analyzer model.
+    5. vector: search the VectorDB (ARGO documentation & FAQ).
 
     @ EXAMPLES
     prompt: Tell me about ARGO.
@@ -115,6 +174,13 @@ Router = TextAgent(
         "output": "~ accurate user demand ~"
     }
 
+    prompt: What does a QC flag of 4 mean?
+    output:
+    {
+        "type": "vector",
+        "output": "~ most probable question ~"
+    }
+
     prompt: When was the most recent ARGO event?
     output:
     {
@@ -135,7 +201,8 @@ Router = TextAgent(
     as well as a log of assistants/tools you have called, along with your instructions and their outputs (if any).
     Do not call the same tool consecutively.
 
-    """
+    """,
+    name="Router"
 )
 
 ''' WEB SEARCH AGENT '''
@@ -153,9 +220,31 @@ Inferencer = TextAgent(
     @ INPUT
     user_question
     knowledge_text
+    """,
+    name="Inferencer"
+)
+
+''' CONVERSATION SUMMARY '''
+
+Summarizer = TextAgent(
+    "openai/gpt-4o-mini",
     """
+    @ INSTRUCTION
+    You keep a running summary of a conversation about ARGO float data.
+    Given the current summary and one more exchange, return the updated summary only.
+    Keep what a follow-up question may refer to: regions, periods, floats, variables,
+    numbers found and plots shown. Drop greetings and formatting. At most 150 words.
+
+    @ INPUT
+    summary
+    exchange
+    """,
+    name="Summarizer"
 )
 
+def summarize(summary, turn):
+    return Summarizer.gen(f"### SUMMARY\n{summary or '(none yet)'}\n\n### EXCHANGE\n{turn}")
+
 '''ANALYZE MODE'''
 
 DBM = TextAgent(
@@ -168,31 +257,26 @@ DBM = TextAgent(
 
     @ SQL SCHEMA 
 
-    CREATE TABLE Data (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    project_name TEXT,
-    pi_name TEXT,
-    platform_number INTEGER,
-    cycle_num INTEGER,
-    data_centre TEXT,
-    data_mode TEXT,
-    float_no INTEGER,
-    firmware INTEGER,
-    platform_type TEXT,
-    juld DATETIME,
-    latitude FLOAT,
-    longitude FLOAT,
-    position_system TEXT);
-
-
-    CREATE TABLE Observation (
-    id INTEGER PRIMARY KEY AUTOINCREMENT,
-    data_id INTEGER,
-    station_param TEXT,
-    pressure FLOAT,
-    temp FLOAT,
-    psal FLOAT);
-    """
+    {schema}
+
+    Values are already QC-merged (adjusted values used where good). BGC columns
+    (doxy, chla, nitrate, ...) are NULL for core floats.
+    absolute_salinity (g/kg), conservative_temp and potential_temp (degC, 0 dbar reference),
+    in-situ density and sigma0 (kg/m3) are TEOS-10 values precomputed per level; use them
+    directly instead of deriving them from temp/psal.
+    Trajectory has one row per profile (data_id = Data.id). Use it for a float's
+    track, surface values over time or depth range instead of joining Observation,
+    e.g. SELECT cycle_num, juld, surface_temp FROM Trajectory WHERE platform_number = 2902746 ORDER BY cycle_num;
+    ProfileFeatures (data_id = Data.id) answers profile characteristics (depth range,
+    surface/bottom values, mixed layer and thermocline depth in dbar, share of good QC)
+    without touching Observation; join it to Data for time and position.
+    Every profile is classified by position: filter ocean basins with Data.basin_code and
+    marginal seas with Data.region_code (the sea code where one matches, else the basin code)
+    instead of latitude/longitude boxes, e.g. "Indian Ocean" -> WHERE basin_code = 3,
+    "Arabian Sea" -> WHERE region_code = 303.
+    Region codes: """ + regions.describe() + """
+    """,
+    name="DBM"
 )
 
 Viz = TextAgent(
@@ -227,7 +311,8 @@ Viz = TextAgent(
 
     DO NOT RETURN ANYTHING EXCEPT EXACTLY THE CODE.
     NO NEED TO ADD ```python ``` at the start and end.
-    """
+    """,
+    name="Viz"
 )
 
 DFM = TextAgent(
@@ -254,9 +339,83 @@ DFM = TextAgent(
 
     DO NOT RETURN ANYTHING EXCEPT EXACTLY THE CODE.
     NO NEED TO ADD ```python ``` at the start and end.
-    """
+    """,
+    name="DFM"
 )
 
+### AGENT BUDGET
+
+# Every invocation gets a step budget (Router turns) and a wall-clock deadline.
+MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", 6))
+DEADLINE_S = float(os.getenv("AGENT_DEADLINE_S", 60))
+# Rough seconds each branch needs; branches that no longer fit are downgraded or skipped.
+BRANCH_COST_S = {
+    "web": float(os.getenv("AGENT_WEB_COST_S", 8)),
+    "research": float(os.getenv("AGENT_RESEARCH_COST_S", 30)),
+    "analyse": float(os.getenv("AGENT_ANALYSE_COST_S", 20)),
+}
+PLOT_COST_S = float(os.getenv("AGENT_PLOT_COST_S", 15))
+# Router action types with a graph branch; anything else is answered with the fallback reply.
+ACTIONS = ("reply", "web", "research", "analyse", "vector")
+# Generated SQL is compiled before it runs; a failing statement goes back to DBM with the error.
+SQL_REPAIR_ATTEMPTS = int(os.getenv("SQL_REPAIR_ATTEMPTS", 2))
+SQL_REPAIR_COST_S = float(os.getenv("AGENT_SQL_REPAIR_COST_S", 8))
+
+def remaining(state):
+    return state["deadline"] - time.monotonic()
+
+def best_answer(state):
+    """Reply built from the latest tool output, used when the budget runs out."""
+    for log in reversed(state["tool_logs"]):
+        if log.get("info"):
+            tag = "ANIMGT" if log.get("img") else "END"
+            return f"{log['info']} {tag}"
+    return "Sorry, I could not finish looking into that in time. Could you try a narrower question? END"
+
+def fallback_reply(state):
+    return json.dumps({
+        "type": "reply",
+        "output": best_answer(state)
+    })
+
+def analyse_failed(state, query, info, img_key=None):
+    """Log an analyse call that produced no analysis; the next Router turn answers from the logs."""
+    logs = state["tool_logs"]
+    logs.append({
+        "action": "analyze",
+        "query": query,
+        "info": info,
+        "img": img_key is not None,
+        "img_key": img_key
+    })
+    return {
+        "tool_logs": logs
+    }
+
+def fit_to_budget(output, state, steps):
+    """Downgrade or drop the Router's chosen action if it cannot fit in what is left."""
+    try:
+        action = json.loads(output)
+    except ValueError:
+        return fallback_reply(state)
+    if not isinstance(action, dict) or action.get("type") not in ACTIONS:
+        print("UNKNOWN ACTION, RETURNING BEST ANSWER")
+        return fallback_reply(state)
+    kind = action.get("type")
+    if kind == "reply":
+        return output
+    if steps >= MAX_STEPS:
+        return fallback_reply(state)
+    left = remaining(state)
+    if kind == "research" and left < BRANCH_COST_S["research"]:
+        print("DOWNGRADING RESEARCH TO WEB SEARCH")
+        kind = "web"
+    if kind in BRANCH_COST_S and left < BRANCH_COST_S[kind]:
+        print(f"SKIPPING {kind.upper()}, {left:.1f}s LEFT")
+        return fallback_reply(state)
+    action["type"] = kind
+    return json.dumps(action)
+
 ### BASE AGENT
 
 class CB(TypedDict):
@@ -264,8 +423,18 @@ class CB(TypedDict):
     output: str
     tool_logs: list[str, str]
     response: str
+    steps: int
+    deadline: float
+    session: str
 
 def start(state: CB):
+    steps = state["steps"] + 1
+    if steps > MAX_STEPS or remaining(state) <= 0:
+        print("BUDGET EXHAUSTED, RETURNING BEST ANSWER")
+        return {
+            "output": fallback_reply(state),
+            "steps": steps
+        }
     prompt = f"""
     ### CONVERSATION
     {state['messages']}
@@ -274,8 +443,17 @@ def start(state: CB):
     {state['tool_logs']}
     """
     print("PROMPT: ",prompt)
+    try:
+        output = Router.gen(prompt, deadline=state["deadline"])
+    except DeadlineExceeded as e:
+        print("OUT OF TIME, RETURNING BEST ANSWER: ", e)
+        return {
+            "output": fallback_reply(state),
+            "steps": steps
+        }
     return {
-        "output": Router.gen(prompt)
+        "output": fit_to_budget(output, state, steps),
+        "steps": steps
     }
 
 def router(state: CB) -> str:
@@ -289,19 +467,25 @@ def router(state: CB) -> str:
 def web_search(state: CB):
     print("WEB SEARCH INVOKED")
     query = json.loads(state["output"])["output"]
-    result = exa.search_and_contents(
-        query,
-        text = True,
-        type = "auto",
-    )
-    prompt = f"""
-    @ USER QUERY
-    {query}
-
-    @ INFORMATION
-    {result}
-    """
-    info = Inferencer.gen(prompt)
+    def lookup(query):
+        result = retrieval_backend.search(query)
+        prompt = f"""
+        @ USER QUERY
+        {query}
+
+        @ INFORMATION
+        {result}
+        """
+        return Inferencer.gen(prompt, deadline=state["deadline"])
+    try:
+        info = retrieval_cache.get_or_fetch(
+            "web", query, WEB_TTL_S, lookup,
+            store_if=lambda _: remaining(state) > 0,
+            timeout=max(remaining(state), 0),
+        ) or ''
+    except DeadlineExceeded as e:
+        print("OUT OF TIME: ", e)
+        info = ''
     print(info)
     logs = state["tool_logs"]
     logs.append({
@@ -317,13 +501,12 @@ def web_search(state: CB):
 def research(state: CB):
     print("RESEARCH INVOKED")
     query = json.loads(state["output"])["output"]
-    research = exa.research.create(
-        instructions = query,
-        model = "exa-research",
-    )
-    x=''
-    for event in exa.research.get(research.research_id, stream = True):
-        x+=str(event)
+    x = retrieval_cache.get_or_fetch(
+        "research", query, RESEARCH_TTL_S,
+        lambda q: retrieval_backend.research(q, deadline=state["deadline"]),
+        store_if=lambda _: remaining(state) > 0,
+        timeout=max(remaining(state), 0),
+    ) or ''
     logs = state["tool_logs"]
     logs.append({
         "action": "research",
@@ -334,6 +517,27 @@ def research(state: CB):
         "tool_logs": logs
     }
 
+def vector(state: CB):
+    print("VECTOR SEARCH INVOKED")
+    query = json.loads(state["output"])["output"]
+    from vector_index import get_index
+    index = get_index()
+    if index is None:
+        info = "VectorDB is not available, fall back to web search."
+    else:
+        hits = index.search(query, k=VECTOR_TOP_K)
+        info = "\n\n".join(f"[{chunk['source']}] {chunk['text']}" for _, chunk in hits)
+    print(info)
+    logs = state["tool_logs"]
+    logs.append({
+        "action": "vector",
+        "query": query,
+        "info": info
+    })
+    return {
+        "tool_logs": logs
+    }
+
 def reply(state: CB):
     print("REPLY INVOKED")
     return {
@@ -342,17 +546,74 @@ def reply(state: CB):
 
 def analyse(state: CB):
     print("ANALYZE INVOKED")
-    cmd = DBM.gen(json.loads(state["output"])["output"])
-    conn = connect_db()
-    curr = conn.cursor()
+    q = json.loads(state["output"])["output"]
+    conn = None
+    if ANALYSE_BACKEND == "duckdb":
+        try:
+            import columnar
+            import duckdb
+            conn = columnar.connect()
+        except (ImportError, FileNotFoundError) as e:
+            print("DUCKDB BACKEND UNAVAILABLE, USING SQLITE: ", e)
+    if conn is not None:
+        guard = columnar
+        schema = columnar.schema_ddl(conn) + columnar.NOTES
+        # a statement can pass validation and still fail while running (e.g. a bad cast)
+        errors = (sql_guard.InvalidSQL, duckdb.Error)
+    else:
+        conn, guard = connect_db(), sql_guard
+        errors = (sql_guard.InvalidSQL, sqlite3.Error)
+        # schema listed from the database itself, so the prompt follows migrations and the compact layout
+        schema = sql_guard.schema_ddl(conn)
+    prompt = DBM.system_prompt.replace("{schema}", schema)
+    session = session_store.peek(state.get("session"))
+    earlier = list(session.results) if session else []
+    if earlier:
+        # earlier results of this conversation, queryable as temp tables for follow-ups
+        sessions.load_results(conn, earlier)
+        prompt += """
+    @ EARLIER RESULTS
+    Results of earlier questions in this conversation are available as tables.
+    When the question narrows, regroups or reuses one of them, select from it instead of the base tables.
+    """ + sessions.describe_results(earlier).replace("\n", "\n    ")
+    attempt = 0
+    try:
+        cmd = DBM.gen(q, deadline=state["deadline"], system_prompt=prompt)
+    except DeadlineExceeded as e:
+        print("OUT OF TIME: ", e)
+        conn.close()
+        return analyse_failed(state, q, "ran out of time writing the SQL query")
+    while True:
+        try:
+            cmd = guard.validate(conn, cmd)
+            hit = session.find_result(cmd) if session else None
+            if hit is None:
+                with metrics.timed(metrics.SQL_SECONDS):
+                    # conn.execute, not a cursor: DuckDB cursors do not see the registered earlier results
+                    curr = conn.execute(cmd)
+                    result = curr.fetchall()
+            break
+        except errors as e:
+            print("INVALID SQL: ", e)
+            attempt += 1
+            if attempt > SQL_REPAIR_ATTEMPTS or remaining(state) < SQL_REPAIR_COST_S:
+                conn.close()
+                return analyse_failed(state, q, f"could not build a working SQL query: {e}")
+            try:
+                cmd = DBM.gen(sql_guard.repair_prompt(q, cmd, e), deadline=state["deadline"], system_prompt=prompt)
+            except DeadlineExceeded as late:
+                print("OUT OF TIME: ", late)
+                conn.close()
+                return analyse_failed(state, q, f"could not build a working SQL query: {e}")
     print(cmd)
-    curr.execute(
-        cmd
-    )
-    result = curr.fetchall()
+    if hit is not None:
+        print("SQL RESULT REUSED: ", hit["name"])
+        result, columns = hit["rows"], hit["columns"]
+    else:
+        metrics.SQL_ROWS.observe(len(result))
+        columns = [desc[0] for desc in curr.description]
     conn.close()
     print(result)
-    columns = [desc[0] for desc in curr.description]
     print(columns)
     global data
     global cols 
@@ -361,68 +622,139 @@ def analyse(state: CB):
     
     print(data, cols)
     input = {
-        "prompt": json.loads(state["output"])["output"],
+        "prompt": q,
         "schema": columns
     }
-    plot = Viz.gen(str(input))
+    global img_key
+    import charts
+    kind = charts.detect(columns, result, input["prompt"]) if result else None
+    if kind is not None:
+        # standard shape: drawn in-process, no Viz call and no sandbox run
+        plot = f"native:{kind}:v{charts.VERSION}"
+        key = plot_key(result, columns, plot)
+        try:
+            if plot_store.lookup(key):
+                print("PLOT CACHE HIT", key)
+            else:
+                with metrics.timed(metrics.RENDER_SECONDS, kind=kind):
+                    plot_store.put(key, charts.render(result, columns, input["prompt"])[1])
+            img_key = key
+        except Exception as e:
+            print("NATIVE RENDER FAILED, FALLING BACK TO VIZ: ", e)
+            kind = None
+    if kind is not None:
+        pass
+    elif remaining(state) > BRANCH_COST_S["analyse"] + PLOT_COST_S:
+        try:
+            plot = retrieval_cache.get_or_fetch(
+                # exact content hash: the cache's normalized text key would merge e.g. "-1.5" and "1.5"
+                "viz", hashlib.sha256(str(input).encode()).hexdigest(), VIZ_TTL_S,
+                lambda _: Viz.gen(str(input), deadline=state["deadline"]),
+                store_if=bool
+            )
+        except DeadlineExceeded as e:
+            print("OUT OF TIME, SKIPPING PLOT: ", e)
+            plot = 'INVAL'
+    else:
+        print("LOW ON TIME, SKIPPING PLOT")
+        plot = 'INVAL'
     print("PYCODE AHEAD ###################")
     print(plot)
-    sandbox = daytona.create()
-    if str(plot) != 'INVAL':
-        response = sandbox.process.code_run(plot)
-        print("RESPONSE: ", response)
-        files = sandbox.fs.download_file("/home/daytona/my_plot.png")
-        var = base64.b64encode(files).decode("ascii")
-        global b64 
-        b64 = var
-        
-
-    alz = DFM.gen(str(input))
-    print(alz)
-    response = sandbox.process.code_run(alz)
-    print("RESPONSE: ", response.result)
-
-    sandbox.delete()
+    with metrics.timed(metrics.SANDBOX_SECONDS, op="create"):
+        sandbox = services.get("daytona").create()
+    # sandbox runs are cut off at the deadline too
+    sandbox_timeout = lambda: max(1, int(remaining(state)))
+    try:
+        if kind is None and str(plot) != 'INVAL':
+            key = plot_key(result, columns, plot)
+            if plot_store.lookup(key):
+                print("PLOT CACHE HIT", key)
+                img_key = key
+            else:
+                try:
+                    with metrics.timed(metrics.SANDBOX_SECONDS, op="plot"):
+                        response = sandbox.process.code_run(plot, timeout=sandbox_timeout())
+                    print("RESPONSE: ", response)
+                    with metrics.timed(metrics.SANDBOX_SECONDS, op="download"):
+                        files = sandbox.fs.download_file("/home/daytona/my_plot.png")
+                    plot_store.put(key, files)
+                    img_key = key
+                except Exception as e:
+                    print("PLOT RUN FAILED: ", e)
+                    plot = 'INVAL'
+
+        try:
+            alz = DFM.gen(str(input), deadline=state["deadline"])
+            print(alz)
+            with metrics.timed(metrics.SANDBOX_SECONDS, op="analysis"):
+                response = sandbox.process.code_run(alz, timeout=sandbox_timeout())
+            print("RESPONSE: ", response.result)
+        except Exception as e:
+            print("ANALYSIS FAILED: ", e)
+            response, failure = None, e
+    finally:
+        with metrics.timed(metrics.SANDBOX_SECONDS, op="delete"):
+            sandbox.delete()
+
+    if session is not None and hit is None:
+        session.add_result(q, cmd, columns, result, img_key if plot != 'INVAL' else None)
+
+    if response is None:
+        return analyse_failed(state, q, f"the query returned {len(result)} rows but the analysis did not finish: {failure}",
+                              img_key if plot != 'INVAL' else None)
 
     logs = state["tool_logs"]
     logs.append({
         "action": "analyze",
         "query": input["prompt"],
         "info": response.result,
-        "img": True if plot != 'INVAL' else False
+        "img": True if plot != 'INVAL' else False,
+        "img_key": img_key if plot != 'INVAL' else None
     })
 
     return {
         "tool_logs": logs
     }
 
-agent_graph = StateGraph(CB)
-agent_graph.add_node("start", start)
-agent_graph.add_node("reply", reply)
-agent_graph.add_node("web", web_search)
-agent_graph.add_node("research", research)
-agent_graph.add_node("analyse", analyse)
-
-
-agent_graph.add_edge(START, "start")
-agent_graph.add_conditional_edges(
-    "start",
-    router,
-    {
-        "reply": "reply",
-        "analyse": "analyse",
-        "vector": "reply",
-        "web": "web",
-        "research": "research"
-    }
-)
-agent_graph.add_edge("reply", END)
-agent_graph.add_edge("web", "start")
-agent_graph.add_edge("research", "start")
-agent_graph.add_edge("analyse", "start")
-agent = agent_graph.compile()
+def build_agent():
+    from langgraph.graph import StateGraph, START, END
+    agent_graph = StateGraph(CB)
+    agent_graph.add_node("start", metrics.instrument_node("start", start))
+    agent_graph.add_node("reply", metrics.instrument_node("reply", reply))
+    agent_graph.add_node("web", metrics.instrument_node("web", web_search))
+    agent_graph.add_node("research", metrics.instrument_node("research", research))
+    agent_graph.add_node("analyse", metrics.instrument_node("analyse", analyse))
+    agent_graph.add_node("vector", metrics.instrument_node("vector", vector))
+
+
+    agent_graph.add_edge(START, "start")
+    agent_graph.add_conditional_edges(
+        "start",
+        router,
+        {
+            "reply": "reply",
+            "analyse": "analyse",
+            "vector": "vector",
+            "web": "web",
+            "research": "research"
+        }
+    )
+    agent_graph.add_edge("reply", END)
+    agent_graph.add_edge("web", "start")
+    agent_graph.add_edge("research", "start")
+    agent_graph.add_edge("analyse", "start")
+    agent_graph.add_edge("vector", "start")
+    return agent_graph.compile()
+
+_agent = None
+
+def get_agent():
+    """Compile the graph on first request instead of at import."""
+    global _agent
+    if _agent is None:
+        _agent = build_agent()
+    return _agent
 
-global b64
 ### APP ARCH
 
 app = Flask(__name__)
@@ -430,13 +762,37 @@ app = Flask(__name__)
 @app.route("/", methods=["GET","POST"])
 def index():
     msg = input("Whats your query?: ")
-    response = agent.invoke({
-        "messages": msg,
-        "output": "",
-        "tool_logs": [],
-        "response": ""
-    })
-    return response["response"]
+    # session id from ?session= / form field or the cookie; a new session is started otherwise
+    session = session_store.get(request.values.get("session") or request.cookies.get("session_id"))
+    trace = metrics.start_trace() if request.args.get("trace") else None
+    try:
+        with metrics.timed(metrics.REQUEST_SECONDS):
+            response = get_agent().invoke({
+                "messages": session.messages(msg),
+                "output": "",
+                "tool_logs": [],
+                "response": "",
+                "steps": 0,
+                "deadline": time.monotonic() + DEADLINE_S,
+                "session": session.id
+            }, {"recursion_limit": 2 * MAX_STEPS + 2})
+    finally:
+        metrics.stop_trace()
+    session.add_turn(msg, response["response"])
+    if session.overflow():
+        # fold the oldest turn into the summary after replying
+        threading.Thread(target=session.compact, args=(summarize,), daemon=True).start()
+    if trace is not None:
+        resp = jsonify({
+            "response": response["response"],
+            "session": session.id,
+            "trace": trace
+        })
+    else:
+        resp = make_response(response["response"])
+    resp.headers["X-Session-Id"] = session.id
+    resp.set_cookie("session_id", session.id, max_age=int(sessions.SESSION_TTL_S), httponly=True, samesite="Lax")
+    return resp
 
 @app.route("/data", methods=["GET","POST"])
 def data():
@@ -447,10 +803,42 @@ def data():
         "cols": cols
     })
 
+def image_response(key, immutable):
+    width = request.args.get("w", type=int)
+    found = plot_store.get(key, width) if key else None
+    if found is None:
+        return Response("no plot", status=404, mimetype="text/plain")
+    body, content_type = found
+    if request.args.get("format") == "base64":
+        # older clients read the latest plot as a base64 string
+        resp = Response(base64.b64encode(body).decode("ascii"), mimetype="text/plain")
+    else:
+        resp = Response(body, mimetype=content_type)
+    resp.set_etag(f"{key}-w{width}" if width else key)
+    if immutable:
+        resp.cache_control.public = True
+        resp.cache_control.max_age = 365 * 24 * 3600
+        resp.cache_control.immutable = True
+    else:
+        resp.cache_control.no_cache = True
+    return resp.make_conditional(request)
+
 @app.route("/img", methods=["GET","POST"])
 def img():
-    global b64
-    return b64
+    # latest plot; revalidated on every use since it changes between questions
+    global img_key
+    return image_response(img_key, immutable=False)
+
+@app.route("/img/<key>", methods=["GET"])
+def img_by_key(key):
+    # content addressed, so cacheable forever
+    if len(key) != 64 or any(c not in "0123456789abcdef" for c in key):
+        return Response("bad key", status=400, mimetype="text/plain")
+    return image_response(key, immutable=True)
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 if __name__ == "__main__":
     app.run(debug=True)
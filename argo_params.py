@@ -0,0 +1,340 @@
+"""Argo parameter registry and vectorized profile decoding.
+
+Every measured parameter (core and BGC) is described once in PARAMS. The
+decoder turns the raw per-file arrays into merged values in one NumPy pass:
+QC flags are decoded straight from their S1 bytes and the adjusted-vs-raw
+choice is made by a single kernel shared by all parameters. Adding a BGC
+variable is a registry entry (or an ARGO_EXTRA_PARAMS env entry), not code.
+"""
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+QC_MISSING = 255        # decoded value of a blank / non-digit QC byte
+GOOD_QC = (1, 2)
+FILL_THRESHOLD = 99999.0
+
+
+class Param:
+    def __init__(self, name, column, units=""):
+        self.name = name            # Argo variable name, e.g. "DOXY"
+        self.column = column        # Observation column, e.g. "doxy"
+        self.units = units
+
+    @property
+    def var(self):
+        return self.name.lower()
+
+
+PARAMS = {}
+
+def register_param(name, column=None, units=""):
+    PARAMS[name] = Param(name, column or name.lower(), units)
+    return PARAMS[name]
+
+register_param("PRES", "pressure", "dbar")
+register_param("TEMP", "temp", "degree_Celsius")
+register_param("PSAL", "psal", "psu")
+register_param("DOXY", "doxy", "micromole/kg")
+register_param("CHLA", "chla", "mg/m3")
+register_param("NITRATE", "nitrate", "micromole/kg")
+register_param("PH_IN_SITU_TOTAL", "ph_in_situ_total", "dimensionless")
+register_param("BBP700", "bbp700", "m-1")
+register_param("DOWNWELLING_PAR", "downwelling_par", "microMoleQuanta/m^2/sec")
+
+# e.g. ARGO_EXTRA_PARAMS="CDOM:cdom,TURBIDITY"
+for _entry in filter(None, os.getenv("ARGO_EXTRA_PARAMS", "").split(",")):
+    _name, _, _column = _entry.strip().partition(":")
+    register_param(_name.upper(), _column or None)
+
+META_VARS = [
+    "platform_number", "project_name", "pi_name", "cycle_number", "data_centre", "data_mode",
+    "float_serial_no", "firmware_version", "platform_type", "juld", "latitude", "longitude",
+    "positioning_system",
+]
+# Observation text column -> per-profile source variable
+TEXT_VARS = {
+    "station_param": "station_parameters",
+    "equation": "scientific_calib_equation",
+    "coefficient": "scientific_calib_coefficient",
+    "comment": "scientific_calib_comment",
+    "history_software": "history_software",
+}
+JULD_EPOCH = np.datetime64("1950-01-01T00:00:00", "us")
+
+
+def needed_variables():
+    """Lower-case names of every variable the decoder may read."""
+    names = list(META_VARS) + list(TEXT_VARS.values())
+    for p in PARAMS.values():
+        names += [p.var, p.var + "_qc", p.var + "_adjusted", p.var + "_adjusted_qc"]
+    return names
+
+# ---------- KERNELS ----------
+def decode_qc(qc):
+    """QC flags as raw S1 bytes (or joined S<n> strings) -> uint8 digits, QC_MISSING where blank."""
+    a = np.ascontiguousarray(qc)
+    if a.dtype.kind == "O":
+        a = a.astype("S1")
+    if a.dtype.kind == "U":
+        a = np.char.encode(a, "ascii")
+    if a.dtype.itemsize > 1:
+        # per-profile strings as produced by CF char decoding: split back into levels
+        a = a.view("S1").reshape(a.shape + (a.dtype.itemsize,))
+    digits = a.view(np.uint8) - np.uint8(48)        # wraps for bytes below '0'
+    return np.where(digits <= 9, digits, np.uint8(QC_MISSING)).astype(np.uint8)
+
+
+def clean_values(values):
+    a = np.asarray(values, dtype=np.float64)
+    return np.where(np.abs(a) >= FILL_THRESHOLD, np.nan, a)
+
+
+def merge_adjusted(raw, raw_qc, adj, adj_qc):
+    """Prefer the adjusted value where it exists, is flagged good and is not flagged better than raw."""
+    use = (
+        np.isfinite(adj)
+        & np.isin(adj_qc, GOOD_QC)
+        & ((raw_qc == QC_MISSING) | (adj_qc >= raw_qc))
+    )
+    return np.where(use, adj, raw), np.where(use, adj_qc, raw_qc)
+
+
+def char_strings(a):
+    """Char array (..., STRINGn) of S1, or already joined S<n>, -> array of stripped str."""
+    a = np.ascontiguousarray(a)
+    if a.dtype.kind == "S" and a.dtype.itemsize == 1 and a.ndim >= 2:
+        a = a.view(f"S{a.shape[-1]}")[..., 0]
+    if a.dtype.kind == "S":
+        return np.char.strip(np.char.decode(a, "latin-1"))
+    return np.char.strip(a.astype(str))
+
+
+def char_column(a, n_prof):
+    """One character per profile (DATA_MODE, DIRECTION) -> array of n_prof str."""
+    a = np.ascontiguousarray(a)
+    if a.dtype.kind == "S":
+        return np.char.strip(np.char.decode(a.reshape(-1).view("S1")[:n_prof], "latin-1"))
+    return np.char.strip(a.reshape(-1).astype(str))[:n_prof]
+
+
+def juld_datetimes(juld):
+    """JULD as datetime64 (xarray decoded) or days since 1950 (raw) -> list of datetime/None.
+
+    Rounded to whole seconds, the precision Argo positions times to, so both
+    readers agree exactly.
+    """
+    a = np.asarray(juld).reshape(-1)
+    if a.dtype.kind == "M":
+        nat = np.isnat(a)
+        a = (a.astype("datetime64[ms]") + np.timedelta64(500, "ms")).astype("datetime64[s]")
+    else:
+        days = clean_values(a)
+        nat = ~np.isfinite(days)
+        secs = np.round(np.where(nat, 0, days) * 86_400).astype("int64")
+        a = JULD_EPOCH.astype("datetime64[s]") + secs.astype("timedelta64[s]")
+    return [None if n else t.astype(datetime) for t, n in zip(a, nat)]
+
+
+def _to_int(s):
+    s = str(s).strip()
+    return int(s) if s.isdigit() else None
+
+# ---------- DECODER ----------
+class ProfileBatch:
+    """Decoded, QC-merged profiles of one file (or one chunk of a file)."""
+    def __init__(self, metas, values, qc, text):
+        self.metas = metas      # list of per-profile dicts matching the Data columns
+        self.values = values    # Observation column -> (n_prof, n_levels) merged values
+        self.qc = qc            # Observation column -> (n_prof, n_levels) merged QC digits
+        self.text = text        # Observation text column -> list of per-profile JSON strings
+
+    def __len__(self):
+        return len(self.metas)
+
+    def level_mask(self):
+        """Levels holding at least one finite value; trailing fill levels are dropped."""
+        return np.logical_or.reduce([np.isfinite(v) for v in self.values.values()])
+
+    def observations(self):
+        """One row per kept level, with a 'prof' column indexing self.metas."""
+        prof, level = np.nonzero(self.level_mask())
+        obs = pd.DataFrame({"prof": prof, "level": level})
+        for column, v in self.values.items():
+            obs[column] = v[prof, level]
+        for column, per_prof in self.text.items():
+            obs[column] = np.asarray(per_prof, dtype=object)[prof]
+        return obs
+
+
+def decode_profiles(arrays):
+    """Decode a dict of lower-case variable name -> array (leading N_PROF axis) into a ProfileBatch."""
+    n_prof = int(np.asarray(arrays["latitude"]).reshape(-1).shape[0])
+
+    def strings(var):
+        return char_strings(arrays[var]) if var in arrays else np.full(n_prof, "")
+
+    metas = []
+    cycle = clean_values(arrays["cycle_number"]).reshape(-1)
+    lat = clean_values(arrays["latitude"]).reshape(-1)
+    lon = clean_values(arrays["longitude"]).reshape(-1)
+    juld = juld_datetimes(arrays["juld"])
+    mode = char_column(arrays["data_mode"], n_prof).tolist()
+    columns = {var: strings(var).tolist() for var in (
+        "platform_number", "project_name", "pi_name", "data_centre", "float_serial_no",
+        "firmware_version", "platform_type", "positioning_system")}
+    for i in range(n_prof):
+        metas.append({
+            "platform_number": _to_int(columns["platform_number"][i]),
+            "project_name": columns["project_name"][i],
+            "pi_name": columns["pi_name"][i],
+            "cycle_num": int(cycle[i]) if np.isfinite(cycle[i]) else None,
+            "data_centre": columns["data_centre"][i],
+            "data_mode": mode[i],
+            "float_no": _to_int(columns["float_serial_no"][i]),
+            "firmware": _to_int(columns["firmware_version"][i]),
+            "platform_type": columns["platform_type"][i],
+            "juld": juld[i],
+            "latitude": float(lat[i]) if np.isfinite(lat[i]) else None,
+            "longitude": float(lon[i]) if np.isfinite(lon[i]) else None,
+            "position_system": columns["positioning_system"][i],
+        })
+
+    values, qc = {}, {}
+    for p in PARAMS.values():
+        if p.var not in arrays:
+            continue
+        raw = clean_values(arrays[p.var])
+        raw_qc = decode_qc(arrays[p.var + "_qc"]) if p.var + "_qc" in arrays else np.full(raw.shape, QC_MISSING, np.uint8)
+        if p.var + "_adjusted" in arrays and p.var + "_adjusted_qc" in arrays:
+            raw, raw_qc = merge_adjusted(raw, raw_qc, clean_values(arrays[p.var + "_adjusted"]),
+                                         decode_qc(arrays[p.var + "_adjusted_qc"]))
+        values[p.column], qc[p.column] = raw, raw_qc
+
+    text = {}
+    for column, var in TEXT_VARS.items():
+        if var not in arrays:
+            text[column] = [json.dumps([])] * n_prof
+            continue
+        s = strings(var)
+        if var == "history_software":       # (N_HISTORY, N_PROF)
+            s = s.T if s.ndim == 2 else s.reshape(n_prof, -1)
+        s = s.reshape(n_prof, -1)
+        text[column] = [json.dumps(list(dict.fromkeys(x for x in row if x))) for row in s]
+
+    return ProfileBatch(metas, values, qc, text)
+
+# ---------- SUMMARIES ----------
+MLD_REF_DBAR = 10.0         # de Boyer Montegut et al. (2004) reference level
+MLD_DELTA_T = 0.2           # degC departure from the reference temperature
+
+
+def _extreme(pres, values, deepest=False):
+    """Value at the shallowest (or deepest) level where both pressure and value are finite (NaN if none)."""
+    valid = np.isfinite(pres) & np.isfinite(values)
+    if deepest:
+        idx = np.argmax(np.where(valid, pres, -np.inf), axis=1)
+    else:
+        idx = np.argmin(np.where(valid, pres, np.inf), axis=1)
+    rows = np.arange(values.shape[0])
+    return np.where(valid.any(axis=1), values[rows, idx], np.nan)
+
+
+def _sorted_by_pressure(pres, temp):
+    """Levels reordered by increasing pressure, invalid levels (NaN) moved to the end."""
+    valid = np.isfinite(pres) & np.isfinite(temp)
+    order = np.argsort(np.where(valid, pres, np.inf), axis=1, kind="stable")
+    p = np.where(np.take_along_axis(valid, order, axis=1), np.take_along_axis(pres, order, axis=1), np.nan)
+    t = np.where(np.isfinite(p), np.take_along_axis(temp, order, axis=1), np.nan)
+    return p, t
+
+
+def mixed_layer_depth(pres, temp):
+    """Pressure of the first level below MLD_REF_DBAR whose temperature departs by more than MLD_DELTA_T."""
+    p, t = _sorted_by_pressure(pres, temp)
+    with np.errstate(invalid="ignore"):
+        ref_idx = np.argmax(p >= MLD_REF_DBAR, axis=1)
+        rows = np.arange(p.shape[0])
+        p_ref, t_ref = p[rows, ref_idx], t[rows, ref_idx]
+        has_ref = p_ref >= MLD_REF_DBAR
+        cond = (p > p_ref[:, None]) & (np.abs(t - t_ref[:, None]) > MLD_DELTA_T)
+    mld = np.where(cond, p, np.inf).min(axis=1)
+    return np.where(has_ref & np.isfinite(mld), mld, np.nan)
+
+
+def thermocline_depth(pres, temp):
+    """Mid-pressure of the layer with the strongest temperature decrease with depth."""
+    p, t = _sorted_by_pressure(pres, temp)
+    dp = np.diff(p, axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grad = np.where(dp > 0, -np.diff(t, axis=1) / dp, np.nan)
+    if grad.shape[1] == 0:
+        return np.full(p.shape[0], np.nan)
+    has = np.isfinite(grad).any(axis=1)
+    idx = np.argmax(np.where(np.isfinite(grad), grad, -np.inf), axis=1)
+    rows = np.arange(p.shape[0])
+    mid = (p[rows, idx] + p[rows, idx + 1]) / 2
+    return np.where(has & (grad[rows, np.where(has, idx, 0)] > 0), mid, np.nan)
+
+
+def qc_pass_ratio(batch):
+    """Share of present values (all parameters) flagged good; NaN when the batch has no QC."""
+    good = total = 0
+    for column, v in batch.values.items():
+        if column not in batch.qc:
+            continue
+        present = np.isfinite(v)
+        total = total + present.sum(axis=1)
+        good = good + (present & np.isin(batch.qc[column], GOOD_QC)).sum(axis=1)
+    if np.isscalar(total):
+        return np.full(len(batch), np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, good / np.maximum(total, 1), np.nan)
+
+
+def _rows(columns, n):
+    return [{k: float(v[i]) if np.isfinite(v[i]) else None for k, v in columns.items()} for i in range(n)]
+
+
+def trajectory_rows(batch):
+    """Per-profile Trajectory rows (without data_id): position, time, surface values, depth range."""
+    n = len(batch)
+    blank = np.full((n, 1), np.nan)
+    pres = batch.values.get("pressure", blank)
+    has_pres = np.isfinite(pres).any(axis=1)
+    rows = _rows({
+        "surface_pressure": _extreme(pres, pres),
+        "surface_temp": _extreme(pres, batch.values.get("temp", blank)),
+        "surface_psal": _extreme(pres, batch.values.get("psal", blank)),
+        "min_pressure": np.where(has_pres, np.fmin.reduce(pres, axis=1), np.nan),
+        "max_pressure": np.where(has_pres, np.fmax.reduce(pres, axis=1), np.nan),
+    }, n)
+    n_levels = batch.level_mask().sum(axis=1) if batch.values else np.zeros(n, dtype=int)
+    for i, (row, meta) in enumerate(zip(rows, batch.metas)):
+        row.update({k: meta[k] for k in ("platform_number", "cycle_num", "juld", "latitude", "longitude")})
+        row["n_levels"] = int(n_levels[i])
+    return rows
+
+
+def feature_rows(batch):
+    """Per-profile ProfileFeatures rows (without data_id), computed on the padded level arrays."""
+    n = len(batch)
+    blank = np.full((n, 1), np.nan)
+    pres = batch.values.get("pressure", blank)
+    temp = batch.values.get("temp", blank)
+    psal = batch.values.get("psal", blank)
+    has_pres = np.isfinite(pres).any(axis=1)
+    return _rows({
+        "min_pressure": np.where(has_pres, np.fmin.reduce(pres, axis=1), np.nan),
+        "max_pressure": np.where(has_pres, np.fmax.reduce(pres, axis=1), np.nan),
+        "surface_temp": _extreme(pres, temp),
+        "surface_psal": _extreme(pres, psal),
+        "bottom_temp": _extreme(pres, temp, deepest=True),
+        "bottom_psal": _extreme(pres, psal, deepest=True),
+        "mixed_layer_depth": mixed_layer_depth(pres, temp),
+        "thermocline_depth": thermocline_depth(pres, temp),
+        "qc_pass_ratio": qc_pass_ratio(batch),
+    }, n)
@@ -0,0 +1,91 @@
+"""Cold-start benchmark for the chat server.
+
+Imports `app` in a fresh interpreter several times and records the median
+wall time plus the slowest modules reported by `python -X importtime`.
+Results are written as JSON; pass a previous result as --baseline to fail
+when cold start regresses by more than --tolerance.
+
+    python bench_import.py --out bench_import.json
+    python bench_import.py --baseline bench_import.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+SNIPPET = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def run_once(module):
+    # no API keys: importing must not need them
+    env = {k: v for k, v in os.environ.items() if not k.endswith(("_API_KEY", "_API_TOKEN"))}
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SNIPPET.format(module=module)],
+        capture_output=True, text=True, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    total = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    return total, float(proc.stdout.strip().splitlines()[-1]), proc.stderr
+
+
+def slowest_modules(importtime_log, top=15):
+    """Parse -X importtime output into the top (module, cumulative_us) pairs."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _self_us, cum_us, name = line[len("import time:"):].split("|")
+        rows.append((name.strip(), int(cum_us)))
+    rows.sort(key=lambda r: r[1], reverse=True)
+    return rows[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="app")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--baseline", default=None, help="previous results JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed slowdown vs baseline")
+    args = parser.parse_args()
+
+    process_s, import_s, log = [], [], ""
+    for _ in range(args.runs):
+        total, imp, log = run_once(args.module)
+        process_s.append(total)
+        import_s.append(imp)
+
+    result = {
+        "module": args.module,
+        "runs": args.runs,
+        "python": sys.version.split()[0],
+        "import_median_s": statistics.median(import_s),
+        "process_median_s": statistics.median(process_s),
+        "slowest_modules_us": slowest_modules(log),
+    }
+    print(f"import {args.module}: median {result['import_median_s'] * 1000:.1f} ms "
+          f"(process {result['process_median_s'] * 1000:.1f} ms) over {args.runs} runs")
+    for name, us in result["slowest_modules_us"][:8]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            base = json.load(f)
+        limit = base["import_median_s"] * (1 + args.tolerance)
+        if result["import_median_s"] > limit:
+            print(f"REGRESSION: {result['import_median_s'] * 1000:.1f} ms > {limit * 1000:.1f} ms allowed")
+            sys.exit(1)
+        print(f"OK: within {args.tolerance:.0%} of baseline {base['import_median_s'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
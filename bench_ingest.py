@@ -0,0 +1,197 @@
+"""Ingest and query benchmark suite on synthetic Argo files.
+
+For each scale (1x, 10x, 100x of --base-files) it generates synthetic
+profile files, then measures:
+  - parse time of read_profiles per file
+  - peak traced memory while parsing
+  - insert throughput of ingest_files into a fresh SQLite database
+  - latency of representative analyse-style queries
+Results are written as JSON tagged with the git commit, and --compare
+prints the ratio against an earlier results file.
+
+    python bench_ingest.py --scales 1,10 --out bench_results.json
+    python bench_ingest.py --compare bench_results.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import parse_argo_folder
+from synth_argo import make_dataset
+
+QUERIES = {
+    "count_observations": "SELECT COUNT(*) FROM Observation",
+    "monthly_mean_surface_temp": """
+        SELECT strftime('%Y-%m', d.juld) AS month, AVG(o.temp)
+        FROM Data d JOIN Observation o ON o.data_id = d.id
+        WHERE o.pressure < 10 GROUP BY month""",
+    "single_float_history": """
+        SELECT d.cycle_num, d.juld, MIN(o.pressure), MAX(o.pressure), AVG(o.temp)
+        FROM Data d JOIN Observation o ON o.data_id = d.id
+        WHERE d.platform_number = (SELECT platform_number FROM Data LIMIT 1)
+        GROUP BY d.id ORDER BY d.cycle_num""",
+    "single_float_history_trajectory": """
+        SELECT cycle_num, juld, min_pressure, max_pressure, surface_temp
+        FROM Trajectory WHERE platform_number = (SELECT platform_number FROM Data LIMIT 1)
+        ORDER BY cycle_num""",
+    "deep_mixed_layers": """
+        SELECT d.platform_number, d.juld, f.mixed_layer_depth
+        FROM ProfileFeatures f JOIN Data d ON d.id = f.data_id
+        WHERE f.mixed_layer_depth > 100 ORDER BY f.mixed_layer_depth DESC LIMIT 20""",
+    "bbox_mean_salinity": """
+        SELECT AVG(o.psal) FROM Data d JOIN Observation o ON o.data_id = d.id
+        WHERE d.latitude BETWEEN -10 AND 25 AND d.longitude BETWEEN 40 AND 100""",
+    "basin_mean_salinity": """
+        SELECT AVG(o.psal) FROM Data d JOIN Observation o ON o.data_id = d.id
+        WHERE d.basin_code = 3""",
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return None
+
+
+def bench_parse(files):
+    times = []
+    levels = 0
+    for f in files:
+        t0 = time.perf_counter()
+        batch = parse_argo_folder.read_profiles(f)
+        times.append(time.perf_counter() - t0)
+        levels += int(batch.level_mask().sum())
+    tracemalloc.start()
+    for f in files[:min(len(files), 20)]:
+        parse_argo_folder.read_profiles(f).observations()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "files": len(files),
+        "rows": levels,
+        "total_s": sum(times),
+        "per_file_median_ms": statistics.median(times) * 1000,
+        "per_file_p95_ms": sorted(times)[int(0.95 * (len(times) - 1))] * 1000,
+        "peak_traced_mb": peak / 1e6,
+    }
+
+
+def bench_insert(files, db_path):
+    t0 = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        rows = parse_argo_folder.ingest_files(files, f"sqlite:///{db_path}")
+    elapsed = time.perf_counter() - t0
+    return {
+        "rows": rows,
+        "total_s": elapsed,
+        "rows_per_s": rows / elapsed if elapsed else None,
+        "db_mb": os.path.getsize(db_path) / 1e6,
+    }
+
+
+def bench_queries(db_path, repeats):
+    conn = sqlite3.connect(db_path)
+    out = {}
+    for name, sql in QUERIES.items():
+        times = []
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            conn.execute(sql).fetchall()
+            times.append(time.perf_counter() - t0)
+        out[name] = {"median_ms": statistics.median(times) * 1000, "min_ms": min(times) * 1000}
+    conn.close()
+    return out
+
+
+def run(scales, base_files, n_prof, n_levels, params, repeats, workdir):
+    results = []
+    for scale in scales:
+        n_files = base_files * scale
+        data_dir = Path(workdir) / f"files_{n_files}_{n_prof}_{n_levels}_{'-'.join(params)}"
+        files = sorted(data_dir.glob("*.nc"))
+        if len(files) != n_files:
+            files = make_dataset(data_dir, n_files, n_prof=n_prof, n_levels=n_levels, params=params,
+                                 data_mode="mixed")
+        db_path = Path(workdir) / f"bench_{scale}x.db"
+        if db_path.exists():
+            db_path.unlink()
+        print(f"scale {scale}x: {n_files} files x {n_prof} profiles x {n_levels} levels")
+        entry = {
+            "scale": scale,
+            "parse": bench_parse(files),
+            "insert": bench_insert(files, db_path),
+            "queries": bench_queries(db_path, repeats),
+        }
+        print(f"  parse {entry['parse']['per_file_median_ms']:.1f} ms/file, "
+              f"peak {entry['parse']['peak_traced_mb']:.1f} MB, "
+              f"insert {entry['insert']['rows_per_s'] or 0:,.0f} rows/s")
+        for name, q in entry["queries"].items():
+            print(f"  {name}: {q['median_ms']:.2f} ms")
+        results.append(entry)
+    return results
+
+
+def compare(new, old):
+    """Print new/old ratios for the headline numbers of matching scales."""
+    old_by_scale = {e["scale"]: e for e in old["results"]}
+    for e in new["results"]:
+        o = old_by_scale.get(e["scale"])
+        if o is None:
+            continue
+        print(f"scale {e['scale']}x vs {old.get('commit')}:")
+        pairs = [
+            ("parse ms/file", e["parse"]["per_file_median_ms"], o["parse"]["per_file_median_ms"]),
+            ("peak MB", e["parse"]["peak_traced_mb"], o["parse"]["peak_traced_mb"]),
+            ("insert s", e["insert"]["total_s"], o["insert"]["total_s"]),
+        ] + [(f"query {k}", v["median_ms"], o["queries"].get(k, {}).get("median_ms"))
+             for k, v in e["queries"].items()]
+        for label, a, b in pairs:
+            if b:
+                print(f"  {label:40s} {a:10.2f} vs {b:10.2f}  ({a / b:5.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark ingest and queries on synthetic Argo data.")
+    parser.add_argument("--scales", default="1,10,100")
+    parser.add_argument("--base-files", type=int, default=5)
+    parser.add_argument("--n-prof", type=int, default=1)
+    parser.add_argument("--n-levels", type=int, default=100)
+    parser.add_argument("--params", default="PRES,TEMP,PSAL")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "floatchat_bench"))
+    parser.add_argument("--out", default=None, help="write results JSON here")
+    parser.add_argument("--compare", default=None, help="earlier results JSON to compare against")
+    args = parser.parse_args()
+
+    results = run([int(s) for s in args.scales.split(",")], args.base_files, args.n_prof,
+                  args.n_levels, tuple(args.params.split(",")), args.repeats, args.workdir)
+    report = {
+        "commit": git_commit(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
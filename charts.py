@@ -0,0 +1,244 @@
+"""In-process renderers for the common shapes of analyse results.
+
+Depth profiles (value vs pressure), T-S diagrams, time series and lat/lon
+maps are recognized from the result column names and drawn on one reused
+Agg canvas, without an LLM call or a sandbox. Large results are reduced
+first: LTTB for lines, grid binning for scatters. Anything else returns
+None and the caller falls back to Viz-generated code.
+"""
+import io
+import threading
+
+import numpy as np
+
+VERSION = 1                 # part of the plot-store key; bump when the drawings change
+MAX_LINE_POINTS = 2000      # per series, after LTTB
+MAX_SCATTER_POINTS = 20000  # after grid binning
+FIGSIZE = (8, 6)
+DPI = 100
+
+PRESSURE = ("pressure", "pres", "min_pressure", "max_pressure", "mixed_layer_depth", "thermocline_depth")
+TEMPERATURE = ("temp", "surface_temp", "bottom_temp", "conservative_temp", "potential_temp")
+SALINITY = ("psal", "surface_psal", "bottom_psal", "absolute_salinity")
+TIME = ("juld", "date", "time", "day", "month", "year")
+LATITUDE = ("latitude", "lat")
+LONGITUDE = ("longitude", "lon")
+TS_WORDS = ("t-s", "ts diagram", "t/s", "temperature-salinity", "temperature vs salinity",
+            "salinity vs temperature", "water mass")
+
+# ---------- SHAPES ----------
+def _find(columns, names):
+    lower = [str(c).lower() for c in columns]
+    for name in names:
+        if name in lower:
+            return lower.index(name)
+    return None
+
+
+def _numeric(rows, i):
+    return np.array([np.nan if r[i] is None else r[i] for r in rows], dtype=np.float64)
+
+
+def _times(rows, i):
+    values = [None if r[i] is None else str(r[i]).strip() for r in rows]
+    if all(v is None or (v.isdigit() and len(v) == 4) for v in values):      # bare years
+        values = [None if v is None else v + "-01-01" for v in values]
+    return np.array([np.datetime64("NaT") if v is None else np.datetime64(v.replace(" ", "T")) for v in values],
+                    dtype="datetime64[s]")
+
+
+def _is_time(rows, i):
+    """True if every value of column i is a date or a bare year (not month or day numbers)."""
+    seen = False
+    for r in rows:
+        if r[i] is None:
+            continue
+        v = str(r[i]).strip()
+        if v.isdigit():
+            if len(v) != 4:
+                return False
+        else:
+            try:
+                np.datetime64(v.replace(" ", "T"))
+            except ValueError:
+                return False
+        seen = True
+    return seen
+
+
+def detect(columns, rows=(), prompt=""):
+    """Chart kind for a result: "map", "timeseries", "ts", "profile" or None."""
+    lat, lon = _find(columns, LATITUDE), _find(columns, LONGITUDE)
+    time_i, pres = _find(columns, TIME), _find(columns, PRESSURE)
+    if time_i is not None and rows and not _is_time(rows, time_i):
+        time_i = None
+    temp, sal = _find(columns, TEMPERATURE), _find(columns, SALINITY)
+    values = _value_columns(columns, rows, {lat, lon, time_i, pres})
+    if lat is not None and lon is not None:
+        return "map"
+    if time_i is not None and values:
+        return "timeseries"
+    if temp is not None and sal is not None and (pres is None or any(w in prompt.lower() for w in TS_WORDS)):
+        return "ts"
+    if pres is not None and values:
+        return "profile"
+    return None
+
+
+def _value_columns(columns, rows, skip):
+    """Indexes of numeric columns not used as axes (id-like columns dropped)."""
+    out = []
+    for i, c in enumerate(columns):
+        name = str(c).lower()
+        if i in skip or name == "id" or name.endswith("_id") or name.endswith("_code") or name in (
+                "platform_number", "cycle_num", "level", "n_levels"):
+            continue
+        sample = next((r[i] for r in rows if r[i] is not None), None)
+        if isinstance(sample, (int, float)) and not isinstance(sample, bool):
+            out.append(i)
+    return out
+
+# ---------- DOWNSAMPLING ----------
+def lttb(x, y, n_out):
+    """Largest-Triangle-Three-Buckets: indexes of n_out points keeping the visual shape of y(x)."""
+    n = len(x)
+    if n <= n_out or n_out < 3:
+        return np.arange(n)
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+    a = 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        nxt_lo, nxt_hi = edges[b + 1], edges[b + 2] if b + 2 < len(edges) else n
+        cx, cy = x[nxt_lo:nxt_hi].mean(), y[nxt_lo:nxt_hi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(np.argmax(area))
+        keep[b + 1] = a
+    return keep
+
+
+def grid_bin(x, y, c, n_out):
+    """Thin a scatter to about n_out points: one averaged point per occupied cell of a square grid."""
+    if len(x) <= n_out:
+        return x, y, c
+    side = max(2, int(np.sqrt(n_out)))
+    xi = np.clip(((x - x.min()) / (np.ptp(x) or 1) * (side - 1)).astype(np.int64), 0, side - 1)
+    yi = np.clip(((y - y.min()) / (np.ptp(y) or 1) * (side - 1)).astype(np.int64), 0, side - 1)
+    cell, inverse, counts = np.unique(xi * side + yi, return_inverse=True, return_counts=True)
+
+    def mean(v):
+        return np.bincount(inverse, weights=v, minlength=len(cell)) / counts
+
+    return mean(x), mean(y), None if c is None else mean(c)
+
+# ---------- RENDERING ----------
+_lock = threading.Lock()
+_figure = None
+
+
+def _canvas():
+    """The shared Figure on its Agg canvas, created once and cleared for each chart."""
+    global _figure
+    if _figure is None:
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        _figure = Figure(figsize=FIGSIZE, dpi=DPI)
+        FigureCanvasAgg(_figure)
+    _figure.clf()
+    return _figure
+
+
+def _finite(*arrays):
+    mask = True
+    for a in arrays:
+        if a is not None:
+            mask = mask & (~np.isnat(a) if a.dtype.kind == "M" else np.isfinite(a))
+    return mask
+
+
+def _draw_profile(ax, columns, rows):
+    """Up to two variables against inverted pressure; the second gets its own top axis."""
+    pres_i = _find(columns, PRESSURE)
+    pres = _numeric(rows, pres_i)
+    handles = []
+    for n, i in enumerate(_value_columns(columns, rows, {pres_i})[:2]):
+        v = _numeric(rows, i)
+        ok = _finite(pres, v)
+        p, v = pres[ok], v[ok]
+        order = np.argsort(p, kind="stable")
+        keep = lttb(p[order], v[order], MAX_LINE_POINTS)
+        target = ax if n == 0 else ax.twiny()
+        handles += target.plot(v[order][keep], p[order][keep], linewidth=0.8, color=f"C{n}", label=columns[i])
+        target.set_xlabel(columns[i], color=f"C{n}")
+    ax.invert_yaxis()
+    ax.set_ylabel(columns[pres_i] + " (dbar)")
+    ax.legend(handles=handles, loc="lower right")
+
+
+def _draw_ts(ax, columns, rows):
+    t, s = _numeric(rows, _find(columns, TEMPERATURE)), _numeric(rows, _find(columns, SALINITY))
+    pres_i = _find(columns, PRESSURE)
+    c = _numeric(rows, pres_i) if pres_i is not None else None
+    ok = _finite(t, s, c)
+    s, t, c = grid_bin(s[ok], t[ok], None if c is None else c[ok], MAX_SCATTER_POINTS)
+    sc = ax.scatter(s, t, c=c, s=4, cmap="viridis_r" if c is not None else None)
+    if c is not None:
+        ax.figure.colorbar(sc, ax=ax, label=columns[pres_i])
+    ax.set_xlabel(columns[_find(columns, SALINITY)])
+    ax.set_ylabel(columns[_find(columns, TEMPERATURE)])
+
+
+def _draw_timeseries(ax, columns, rows):
+    time_i = _find(columns, TIME)
+    t = _times(rows, time_i)
+    for i in _value_columns(columns, rows, {time_i})[:4]:
+        v = _numeric(rows, i)
+        ok = _finite(t, v)
+        tt, v = t[ok], v[ok]
+        order = np.argsort(tt, kind="stable")
+        tt, v = tt[order], v[order]
+        keep = lttb(tt.astype(np.int64).astype(np.float64), v, MAX_LINE_POINTS)
+        ax.plot(tt[keep], v[keep], linewidth=0.9, label=columns[i])
+    ax.set_xlabel(columns[time_i])
+    ax.legend(loc="best")
+    ax.figure.autofmt_xdate()
+
+
+def _draw_map(ax, columns, rows):
+    lat_i, lon_i = _find(columns, LATITUDE), _find(columns, LONGITUDE)
+    lat, lon = _numeric(rows, lat_i), _numeric(rows, lon_i)
+    values = _value_columns(columns, rows, {lat_i, lon_i, _find(columns, TIME)})
+    c = _numeric(rows, values[0]) if values else None
+    ok = _finite(lat, lon, c)
+    lon, lat, c = grid_bin(lon[ok], lat[ok], None if c is None else c[ok], MAX_SCATTER_POINTS)
+    sc = ax.scatter(lon, lat, c=c, s=6, cmap="coolwarm" if c is not None else None)
+    if c is not None:
+        ax.figure.colorbar(sc, ax=ax, label=columns[values[0]])
+    ax.set_xlabel("longitude")
+    ax.set_ylabel("latitude")
+    ax.set_aspect("equal", adjustable="box")
+    ax.grid(True, linewidth=0.3)
+
+
+DRAW = {"profile": _draw_profile, "ts": _draw_ts, "timeseries": _draw_timeseries, "map": _draw_map}
+
+
+def render(rows, columns, prompt=""):
+    """(kind, PNG bytes) for a recognized result shape, or None when Viz should handle it."""
+    rows = list(rows)
+    if not rows:
+        return None
+    kind = detect(columns, rows, prompt)
+    if kind is None:
+        return None
+    with _lock:
+        fig = _canvas()
+        ax = fig.add_subplot(1, 1, 1)
+        DRAW[kind](ax, list(columns), rows)
+        if prompt:
+            ax.set_title(prompt[:90])
+        fig.tight_layout()
+        buf = io.BytesIO()
+        fig.savefig(buf, format="png")
+    return kind, buf.getvalue()
@@ -0,0 +1,284 @@
+"""Parquet export of the Argo database and a DuckDB query backend over it.
+
+export() writes Observation joined with its profile's metadata (values are
+already QC-merged at ingest) as a Parquet dataset partitioned by
+year/month/basin_code, with min/max statistics per row group. The
+per-profile tables (Data, Trajectory, ProfileFeatures, Region) are
+written as one file each. connect() opens an in-memory DuckDB connection
+with views of the same names over those files, so an aggregation over
+millions of levels reads only the columns it uses and, when it filters
+on year, month or basin_code, only the matching partitions.
+
+Each export goes to a new version directory; the manifest naming the live
+one is replaced in a single step, so readers see either the old export or
+the new one, never a mix.
+
+    python columnar.py export app.db parquet
+    python columnar.py query parquet "SELECT basin_code, avg(psal) FROM Observation GROUP BY 1"
+
+pyarrow and duckdb are optional; the SQLite path does not need them.
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from pathlib import Path
+
+from sql_guard import InvalidSQL, clean
+
+PARQUET_DIR = os.getenv("PARQUET_DIR", "parquet")
+EXPORT_PROFILES = int(os.getenv("PARQUET_EXPORT_PROFILES", 5000))   # profiles read from SQLite per chunk
+ROW_GROUP_ROWS = int(os.getenv("PARQUET_ROW_GROUP_ROWS", 128 * 1024))
+COMPRESSION = os.getenv("PARQUET_COMPRESSION", "zstd")
+PROFILE_TABLES = ("Data", "Trajectory", "ProfileFeatures", "Region")
+# profile columns repeated on every level, so level queries filter and group without a join
+LEVEL_META = ("platform_number", "cycle_num", "juld", "latitude", "longitude", "region_code")
+PARTITIONS = ("year", "month", "basin_code")
+MANIFEST = "_export.json"     # points at the live version directory
+
+NOTES = """
+    The tables above are DuckDB views over Parquet files: write DuckDB SQL
+    (e.g. year(juld), date_trunc('month', juld), no strftime). Observation also carries its
+    profile's platform_number, cycle_num, juld, latitude, longitude, region_code and the
+    partition columns year, month and basin_code; filter and group on those directly
+    instead of joining Data, so only the needed partitions are read.
+"""
+
+# ---------- EXPORT ----------
+def _arrow_type(decl):
+    import pyarrow as pa
+    decl = (decl or "").upper()
+    if "INT" in decl:
+        return pa.int64()
+    if any(t in decl for t in ("REAL", "FLOA", "DOUB", "NUMERIC")):
+        return pa.float64()
+    if "DATE" in decl or "TIME" in decl:
+        return pa.timestamp("us")
+    return pa.string()
+
+
+def _columns(conn, table):
+    return [(r[1], r[2]) for r in conn.execute(f'PRAGMA table_info("{table}")')]
+
+
+def _batch(df, schema):
+    """pandas chunk -> RecordBatch with the export schema (NaN to null, text dates to timestamps)."""
+    import pandas as pd
+    import pyarrow as pa
+    arrays = []
+    for field in schema:
+        col = df[field.name]
+        if pa.types.is_timestamp(field.type):
+            col = pd.to_datetime(col, errors="coerce")
+        arrays.append(pa.array(col, type=field.type, from_pandas=True))
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _export_table(conn, table, path):
+    import pandas as pd
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    schema = pa.schema([(name, _arrow_type(decl)) for name, decl in _columns(conn, table)])
+    tmp = path.with_suffix(".parquet.part")
+    rows = 0
+    with pq.ParquetWriter(tmp, schema, compression=COMPRESSION) as writer:
+        for df in pd.read_sql_query(f'SELECT * FROM "{table}"', conn, chunksize=ROW_GROUP_ROWS):
+            writer.write_batch(_batch(df, schema), row_group_size=ROW_GROUP_ROWS)
+            rows += len(df)
+    os.replace(tmp, path)
+    return rows
+
+
+def _observation_batches(conn, schema, values, counter):
+    import numpy as np
+    import pandas as pd
+    lo, hi = conn.execute('SELECT min(id), max(id) FROM "Data"').fetchone()
+    if lo is None:
+        return
+    meta = ", ".join(f'd."{c}"' for c in LEVEL_META)
+    cols = ", ".join(f'o."{c}"' for c in values)
+    query = f"""
+        SELECT o.data_id, {meta}, d.basin_code, {cols}
+        FROM "Observation" o JOIN "Data" d ON d.id = o.data_id
+        WHERE o.data_id BETWEEN ? AND ?
+        ORDER BY o.data_id, o.id
+    """
+    for start in range(lo, hi + 1, EXPORT_PROFILES):
+        df = pd.read_sql_query(query, conn, params=(start, start + EXPORT_PROFILES - 1))
+        if df.empty:
+            continue
+        juld = pd.to_datetime(df["juld"], errors="coerce")
+        df["year"] = juld.dt.year.fillna(0).astype(np.int64)         # 0: unknown date
+        df["month"] = juld.dt.month.fillna(0).astype(np.int64)
+        df["basin_code"] = df["basin_code"].fillna(0).astype(np.int64)
+        counter[0] += len(df)
+        yield _batch(df, schema)
+
+
+def export(db_path, out_dir=PARQUET_DIR):
+    """Write the Parquet export of db_path (ingest layout) to out_dir; returns {table: rows}.
+
+    The export is written to a new version directory and made live by
+    replacing the manifest. The previous version is kept for queries still
+    reading it; older ones are removed.
+    """
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    previous = _current(out)
+    version = f"v{time.time_ns()}"
+    dest = out / version
+    dest.mkdir()
+    # write_dataset pulls the Observation batches from its own thread
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    counts = {}
+    try:
+        for table in PROFILE_TABLES:
+            if _columns(conn, table):
+                counts[table] = _export_table(conn, table, dest / f"{table}.parquet")
+        obs = _columns(conn, "Observation")
+        data = dict(_columns(conn, "Data"))
+        values = [name for name, decl in obs if name not in ("id", "data_id") and _arrow_type(decl) == pa.float64()]
+        fields = [("data_id", pa.int64())] + [(c, _arrow_type(data.get(c))) for c in LEVEL_META]
+        fields += [(c, pa.float64()) for c in values] + [(c, pa.int64()) for c in PARTITIONS]
+        schema = pa.schema(fields)
+        counter = [0]
+        ds.write_dataset(
+            _observation_batches(conn, schema, values, counter),
+            dest / "Observation",
+            schema=schema,
+            format="parquet",
+            partitioning=ds.partitioning(pa.schema([(c, pa.int64()) for c in PARTITIONS]), flavor="hive"),
+            basename_template="part-{i}.parquet",
+            max_partitions=100_000,
+            min_rows_per_group=ROW_GROUP_ROWS,
+            max_rows_per_group=ROW_GROUP_ROWS,
+            file_options=ds.ParquetFileFormat().make_write_options(compression=COMPRESSION, write_statistics=True),
+        )
+        counts["Observation"] = counter[0]
+    except BaseException:
+        shutil.rmtree(dest, ignore_errors=True)
+        raise
+    finally:
+        conn.close()
+    tmp = out / f"{MANIFEST}.tmp"
+    tmp.write_text(json.dumps({"current": version, "source": str(db_path), "rows": counts, "exported_at": time.time()}))
+    os.replace(tmp, out / MANIFEST)
+    for old in out.glob("v*"):
+        if old.is_dir() and old.name not in (version, previous):
+            shutil.rmtree(old, ignore_errors=True)
+    return counts
+
+
+def _current(root):
+    """Name of the live version directory under root, or None without an export."""
+    try:
+        return json.loads((Path(root) / MANIFEST).read_text()).get("current")
+    except FileNotFoundError:
+        return None
+
+# ---------- DUCKDB BACKEND ----------
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+
+def connect(root=PARQUET_DIR):
+    """In-memory DuckDB connection with Data, Observation, ... views over the export in root.
+
+    File access is limited to root and the configuration is locked, so
+    queries cannot read or write anything else.
+    """
+    import duckdb
+    root = Path(root).resolve()
+    version = _current(root)
+    if version is None:
+        raise FileNotFoundError(f"no Parquet export in {root}, run: python columnar.py export app.db {root}")
+    root = root / version
+    conn = duckdb.connect()
+    conn.execute(f"SET allowed_directories = ['{_quote(root)}/']")
+    conn.execute("SET enable_external_access = false")
+    for table in PROFILE_TABLES:
+        path = root / f"{table}.parquet"
+        if path.exists():
+            conn.execute(f"CREATE VIEW \"{table}\" AS SELECT * FROM read_parquet('{_quote(path)}')")
+    conn.execute(f"CREATE VIEW \"Observation\" AS SELECT * FROM read_parquet("
+                 f"'{_quote(root)}/Observation/**/*.parquet', hive_partitioning = true)")
+    conn.execute("SET lock_configuration = true")
+    return conn
+
+
+def _quote(path):
+    return str(path).replace("'", "''")
+
+
+def schema_ddl(conn, root=PARQUET_DIR):
+    """CREATE TABLE-style listing of the views, cached per export."""
+    stamp = _current(root)
+    key = str(Path(root).resolve())
+    with _schema_lock:
+        hit = _schema_cache.get(key)
+        if hit is not None and hit[0] == stamp:
+            return hit[1]
+    blocks = []
+    for table in PROFILE_TABLES + ("Observation",):
+        try:
+            cols = conn.execute(f'DESCRIBE "{table}"').fetchall()
+        except Exception:
+            continue
+        blocks.append(f"CREATE TABLE {table} (\n" + ",\n".join(f"{c[0]} {c[1]}" for c in cols) + ");")
+    ddl = "\n\n".join(blocks)
+    with _schema_lock:
+        _schema_cache[key] = (stamp, ddl)
+    return ddl
+
+
+def validate(conn, sql):
+    """Return the cleaned statement if DuckDB binds it as a single SELECT, else raise InvalidSQL."""
+    import duckdb
+    sql = clean(sql)
+    if not sql:
+        raise InvalidSQL("empty statement")
+    try:
+        statements = conn.extract_statements(sql)
+    except duckdb.Error as e:
+        raise InvalidSQL(str(e)) from e
+    if len(statements) != 1:
+        raise InvalidSQL("more than one SQL statement; write a single SELECT")
+    if statements[0].type != duckdb.StatementType.SELECT:
+        raise InvalidSQL("only read-only SELECT queries are allowed")
+    try:
+        conn.execute("EXPLAIN " + sql)
+    except duckdb.Error as e:
+        raise InvalidSQL(str(e)) from e
+    return sql
+
+# ---------- MAIN ----------
+def main():
+    parser = argparse.ArgumentParser(description="Parquet export of the Argo database and DuckDB queries over it.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    exp = sub.add_parser("export", help="write the Parquet export of a database")
+    exp.add_argument("db")
+    exp.add_argument("out", nargs="?", default=PARQUET_DIR)
+    qry = sub.add_parser("query", help="run one SQL query against an export")
+    qry.add_argument("root")
+    qry.add_argument("sql")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "export":
+        for table, rows in export(args.db, args.out).items():
+            print(f"{table}: {rows} rows")
+    else:
+        cur = connect(args.root).execute(args.sql)
+        print([d[0] for d in cur.description])
+        for row in cur.fetchmany(50):
+            print(row)
+    print(f"done in {time.perf_counter() - t0:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
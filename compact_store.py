@@ -0,0 +1,286 @@
+"""Compact typed storage layout for the Argo database.
+
+Converts a database in the ingest layout (Data + Observation) into one of
+two compact layouts:
+
+  clustered  Observation rows in a WITHOUT ROWID table keyed on
+             (data_id, level): no separate rowid, no data_id index, rows of
+             one profile stored together.
+  packed     one row per profile with each parameter as a little-endian
+             float32 BLOB; f32_* SQL functions decode them.
+
+Both store juld as integer epoch seconds, enum-encode data_mode and
+position_system, and keep the per-profile text (station parameters,
+calibration, history) once per profile instead of on every level. Views
+named Data and Observation expose the original columns, so existing SQL
+keeps working against the compact file.
+
+    python compact_store.py convert app.db app_compact.db --layout clustered
+    python compact_store.py report app.db app_compact.db
+"""
+import argparse
+import os
+import sqlite3
+import struct
+import sys
+import time
+
+TEXT_COLUMNS = ("station_param", "equation", "coefficient", "comment", "history_software")
+SKIP_COLUMNS = ("id", "data_id") + TEXT_COLUMNS
+MAX_LEVELS_FALLBACK = 4096
+# tables maintained at ingest; copied as-is with their indexes
+DERIVED_TABLES = ("Trajectory", "ProfileFeatures", "Region")
+DATA_COLUMNS = ("id", "project_name", "pi_name", "platform_number", "cycle_num", "data_centre", "data_mode",
+                "float_no", "firmware", "platform_type", "juld", "latitude", "longitude", "position_system")
+
+# ---------- SQL FUNCTIONS ----------
+def _f32_at(blob, i):
+    if blob is None or i is None or i < 0 or 4 * i + 4 > len(blob):
+        return None
+    v = struct.unpack_from("<f", blob, 4 * i)[0]
+    return None if v != v else v
+
+def _f32_values(blob):
+    if blob is None:
+        return ()
+    return [v for v in struct.unpack(f"<{len(blob) // 4}f", blob) if v == v]
+
+def _f32_avg(blob):
+    vals = _f32_values(blob)
+    return sum(vals) / len(vals) if vals else None
+
+def register_functions(conn):
+    """Register the float32 BLOB decoders used by the packed layout."""
+    conn.create_function("f32_at", 2, _f32_at, deterministic=True)
+    conn.create_function("f32_len", 1, lambda b: None if b is None else len(b) // 4, deterministic=True)
+    conn.create_function("f32_min", 1, lambda b: min(_f32_values(b), default=None), deterministic=True)
+    conn.create_function("f32_max", 1, lambda b: max(_f32_values(b), default=None), deterministic=True)
+    conn.create_function("f32_avg", 1, _f32_avg, deterministic=True)
+    return conn
+
+# ---------- CONVERSION ----------
+def _value_columns(conn):
+    cols = [r[1] for r in conn.execute("PRAGMA src.table_info(Observation)")]
+    return [c for c in cols if c not in SKIP_COLUMNS]
+
+
+def _create_common(conn):
+    # Data columns added after the base layout (region codes, ...) carry over unchanged
+    extra = [(r[1], r[2]) for r in conn.execute("PRAGMA src.table_info(Data)") if r[1] not in DATA_COLUMNS]
+    extra_defs = "".join(f',\n        "{name}" {decl}' for name, decl in extra)
+    extra_src = "".join(f', d."{name}"' for name, _ in extra)
+    extra_view = "".join(f', p."{name}"' for name, _ in extra)
+    conn.executescript(f"""
+    CREATE TABLE DataMode (code INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+    CREATE TABLE PositionSystem (code INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+    CREATE TABLE Profile (
+        id INTEGER PRIMARY KEY,
+        platform_number INTEGER,
+        cycle_num INTEGER,
+        juld INTEGER,               -- epoch seconds, UTC
+        latitude REAL,
+        longitude REAL,
+        data_mode INTEGER REFERENCES DataMode(code),
+        position_system INTEGER REFERENCES PositionSystem(code),
+        project_name TEXT,
+        pi_name TEXT,
+        data_centre TEXT,
+        float_no INTEGER,
+        firmware INTEGER,
+        platform_type TEXT{extra_defs});
+    CREATE TABLE ProfileText (
+        data_id INTEGER PRIMARY KEY,
+        station_param TEXT, equation TEXT, coefficient TEXT, comment TEXT, history_software TEXT);
+
+    INSERT INTO DataMode(name)
+        SELECT DISTINCT data_mode FROM src.Data WHERE data_mode IS NOT NULL ORDER BY 1;
+    INSERT INTO PositionSystem(name)
+        SELECT DISTINCT position_system FROM src.Data WHERE position_system IS NOT NULL ORDER BY 1;
+    INSERT INTO Profile
+        SELECT d.id, d.platform_number, d.cycle_num, CAST(strftime('%s', d.juld) AS INTEGER),
+               d.latitude, d.longitude, m.code, p.code,
+               d.project_name, d.pi_name, d.data_centre, d.float_no, d.firmware, d.platform_type{extra_src}
+        FROM src.Data d
+        LEFT JOIN DataMode m ON m.name = d.data_mode
+        LEFT JOIN PositionSystem p ON p.name = d.position_system
+        ORDER BY d.id;
+    INSERT INTO ProfileText
+        SELECT data_id, station_param, equation, coefficient, comment, history_software
+        FROM src.Observation WHERE id IN (SELECT MIN(id) FROM src.Observation GROUP BY data_id)
+        ORDER BY data_id;
+
+    CREATE VIEW Data AS
+        SELECT p.id, p.project_name, p.pi_name, p.platform_number, p.cycle_num, p.data_centre,
+               m.name AS data_mode, p.float_no, p.firmware, p.platform_type,
+               datetime(p.juld, 'unixepoch') AS juld, p.latitude, p.longitude,
+               s.name AS position_system{extra_view}
+        FROM Profile p
+        LEFT JOIN DataMode m ON m.code = p.data_mode
+        LEFT JOIN PositionSystem s ON s.code = p.position_system;
+    """)
+
+
+def _convert_clustered(conn, value_cols):
+    defs = ", ".join(f'"{c}" REAL' for c in value_cols)
+    cols = ", ".join(f'"{c}"' for c in value_cols)
+    conn.executescript(f"""
+    CREATE TABLE ObservationC (
+        data_id INTEGER NOT NULL,
+        level INTEGER NOT NULL,
+        {defs},
+        PRIMARY KEY (data_id, level)) WITHOUT ROWID;
+    INSERT INTO ObservationC
+        SELECT data_id, ROW_NUMBER() OVER (PARTITION BY data_id ORDER BY id) - 1, {cols}
+        FROM src.Observation ORDER BY data_id, id;
+    CREATE VIEW Observation AS
+        SELECT (o.data_id << 16) | o.level AS id, o.data_id, o.level, {", ".join(f'o."{c}"' for c in value_cols)},
+               t.station_param, t.equation, t.coefficient, t.comment, t.history_software
+        FROM ObservationC o LEFT JOIN ProfileText t ON t.data_id = o.data_id;
+    """)
+
+
+def _convert_packed(conn, value_cols):
+    cols = ", ".join(f'"{c}"' for c in value_cols)
+    conn.execute(f"""
+    CREATE TABLE ProfileLevels (
+        data_id INTEGER PRIMARY KEY,
+        n_levels INTEGER NOT NULL,
+        {", ".join(f'"{c}" BLOB' for c in value_cols)})""")
+
+    def pack(values):
+        return struct.pack(f"<{len(values)}f", *(float("nan") if v is None else v for v in values))
+
+    rows = conn.execute(f"SELECT data_id, {cols} FROM src.Observation ORDER BY data_id, id")
+    batch, current, levels = [], None, []
+
+    def flush():
+        if current is not None:
+            batch.append((current, len(levels)) + tuple(pack([l[i] for l in levels]) for i in range(len(value_cols))))
+
+    for row in rows:
+        if row[0] != current:
+            flush()
+            current, levels = row[0], []
+            if len(batch) >= 1000:
+                conn.executemany(f"INSERT INTO ProfileLevels VALUES ({', '.join('?' * (len(value_cols) + 2))})", batch)
+                batch = []
+        levels.append(row[1:])
+    flush()
+    if batch:
+        conn.executemany(f"INSERT INTO ProfileLevels VALUES ({', '.join('?' * (len(value_cols) + 2))})", batch)
+
+    max_levels = conn.execute("SELECT MAX(n_levels) FROM ProfileLevels").fetchone()[0] or MAX_LEVELS_FALLBACK
+    conn.execute("CREATE TABLE Levels (i INTEGER PRIMARY KEY)")
+    conn.executemany("INSERT INTO Levels VALUES (?)", ((i,) for i in range(max_levels)))
+    conn.execute(f"""
+    CREATE VIEW Observation AS
+        SELECT (p.data_id << 16) | l.i AS id, p.data_id, l.i AS level,
+               {", ".join(f'f32_at(p."{c}", l.i) AS "{c}"' for c in value_cols)},
+               t.station_param, t.equation, t.coefficient, t.comment, t.history_software
+        FROM ProfileLevels p
+        JOIN Levels l ON l.i < p.n_levels
+        LEFT JOIN ProfileText t ON t.data_id = p.data_id""")
+
+
+def _copy_derived(conn):
+    for table in DERIVED_TABLES:
+        ddl = conn.execute("SELECT sql FROM src.sqlite_master WHERE type = 'table' AND name = ?",
+                           (table,)).fetchone()
+        if ddl is None:
+            continue
+        conn.execute(ddl[0])
+        conn.execute(f'INSERT INTO "{table}" SELECT * FROM src."{table}"')
+        for (index_sql,) in conn.execute("SELECT sql FROM src.sqlite_master WHERE type = 'index' "
+                                         "AND tbl_name = ? AND sql IS NOT NULL", (table,)).fetchall():
+            conn.execute(index_sql)
+
+
+def convert(src_path, dst_path, layout="clustered"):
+    """Write a compact copy of src_path to dst_path (which must not exist)."""
+    if os.path.exists(dst_path):
+        raise FileExistsError(dst_path)
+    conn = register_functions(sqlite3.connect(dst_path))
+    conn.execute("ATTACH DATABASE ? AS src", (src_path,))
+    value_cols = _value_columns(conn)
+    with conn:
+        _create_common(conn)
+        if layout == "clustered":
+            _convert_clustered(conn, value_cols)
+        elif layout == "packed":
+            _convert_packed(conn, value_cols)
+        else:
+            raise ValueError(f"unknown layout {layout!r}")
+        _copy_derived(conn)
+        conn.execute("CREATE INDEX ix_profile_platform ON Profile(platform_number, cycle_num)")
+        conn.execute("CREATE INDEX ix_profile_juld ON Profile(juld)")
+        for (name,) in conn.execute("SELECT name FROM pragma_table_info('Profile') WHERE name LIKE '%\\_code' ESCAPE '\\'").fetchall():
+            conn.execute(f'CREATE INDEX "ix_profile_{name}" ON Profile("{name}")')
+    conn.execute("DETACH DATABASE src")
+    conn.execute("VACUUM")
+    conn.close()
+
+# ---------- REPORT ----------
+SCANS = {
+    "full_scan_avg_temp": "SELECT AVG(temp) FROM Observation",
+    "surface_temp_by_month": """
+        SELECT strftime('%Y-%m', d.juld) AS month, AVG(o.temp)
+        FROM Data d JOIN Observation o ON o.data_id = d.id
+        WHERE o.pressure < 10 GROUP BY month""",
+    "one_profile": "SELECT pressure, temp, psal FROM Observation WHERE data_id = (SELECT MAX(id) FROM Data)",
+}
+NATIVE_SCANS = {
+    "clustered": {"full_scan_avg_temp": "SELECT AVG(temp) FROM ObservationC"},
+    "packed": {"full_scan_avg_temp":
+               "SELECT SUM(f32_avg(temp) * n_levels) / SUM(n_levels) FROM ProfileLevels"},
+}
+
+
+def _layout(conn):
+    names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+    return "clustered" if "ObservationC" in names else "packed" if "ProfileLevels" in names else "row"
+
+
+def _time(conn, sql, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        conn.execute(sql).fetchall()
+        best = min(best, time.perf_counter() - t0)
+    return best * 1000
+
+
+def report(paths, repeats=3):
+    for path in paths:
+        conn = register_functions(sqlite3.connect(path))
+        layout = _layout(conn)
+        n_obs = conn.execute("SELECT COUNT(*) FROM Observation").fetchone()[0]
+        size = os.path.getsize(path)
+        print(f"{path} [{layout}]: {size / 1e6:.2f} MB, {n_obs} levels, "
+              f"{size / max(n_obs, 1):.1f} bytes/level")
+        scans = dict(SCANS)
+        scans.update({f"{k} (native)": v for k, v in NATIVE_SCANS.get(layout, {}).items()})
+        for name, sql in scans.items():
+            print(f"  {name:36s} {_time(conn, sql, repeats):9.2f} ms")
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert to / report on the compact Argo storage layout.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert")
+    c.add_argument("src")
+    c.add_argument("dst")
+    c.add_argument("--layout", choices=["clustered", "packed"], default="clustered")
+    r = sub.add_parser("report")
+    r.add_argument("dbs", nargs="+")
+    r.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    if args.cmd == "convert":
+        convert(args.src, args.dst, args.layout)
+        print(f"Wrote {args.dst} ({args.layout})")
+    else:
+        report(args.dbs, args.repeats)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Selective download driven by the Argo GDAC profile index.
+
+The GDACs publish ar_index_global_prof.txt, one line per profile file with
+its date, position, ocean, institution and last update time. Filtering that
+index first means only the files matching a region / time window / platform
+list / data mode are fetched, from however many directories they live in.
+
+The index and the files can come from a GDAC over HTTP(S), from a local
+HTTP stand-in, or from a local mirror directory.
+"""
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from urllib.parse import urlparse
+
+import pandas as pd
+import requests
+
+GDAC_URL = os.getenv("ARGO_GDAC_URL", "https://data-argo.ifremer.fr/")
+INDEX_NAME = "ar_index_global_prof.txt"
+DOWNLOAD_WORKERS = int(os.getenv("ARGO_DOWNLOAD_WORKERS", 8))
+
+
+def _is_remote(location):
+    return urlparse(str(location)).scheme in ("http", "https")
+
+
+def _local_path(location):
+    parsed = urlparse(str(location))
+    return Path(parsed.path if parsed.scheme == "file" else str(location))
+
+
+def read_index(location):
+    """Load a profile index (path, file:// or http(s) URL; .gz is fine) into a DataFrame.
+
+    Adds 'platform' (WMO number from the path) and 'data_mode' (R/A/D from
+    the file name prefix; BGC 'B'/'S'/'M' prefixes are skipped).
+    """
+    source = location if _is_remote(location) else _local_path(location)
+    df = pd.read_csv(source, comment="#", dtype={"file": str, "ocean": str, "institution": str},
+                     skipinitialspace=True)
+    df["date"] = pd.to_datetime(df["date"].astype("Int64").astype(str), format="%Y%m%d%H%M%S", errors="coerce")
+    df["date_update"] = pd.to_datetime(df["date_update"].astype("Int64").astype(str), format="%Y%m%d%H%M%S",
+                                       errors="coerce")
+    parts = df["file"].str.split("/")
+    df["platform"] = pd.to_numeric(parts.str[1], errors="coerce").astype("Int64")
+    names = parts.str[-1].str.lstrip("BSM")
+    df["data_mode"] = names.str[0].where(names.str[0].isin(["R", "A", "D"]))
+    return df
+
+
+def select(index, bbox=None, start=None, end=None, platforms=None, data_modes=None,
+           oceans=None, updated_since=None):
+    """Filter the index.
+
+    bbox is (lat_min, lat_max, lon_min, lon_max); lon_min > lon_max means the
+    box crosses the dateline. start/end bound the profile date (end
+    exclusive), updated_since bounds date_update for incremental refreshes.
+    """
+    mask = pd.Series(True, index=index.index)
+    if bbox is not None:
+        lat_min, lat_max, lon_min, lon_max = bbox
+        mask &= index["latitude"].between(lat_min, lat_max)
+        if lon_min <= lon_max:
+            mask &= index["longitude"].between(lon_min, lon_max)
+        else:
+            mask &= (index["longitude"] >= lon_min) | (index["longitude"] <= lon_max)
+    if start is not None:
+        mask &= index["date"] >= pd.Timestamp(start)
+    if end is not None:
+        mask &= index["date"] < pd.Timestamp(end)
+    if platforms:
+        mask &= index["platform"].isin([int(p) for p in platforms])
+    if data_modes:
+        mask &= index["data_mode"].isin(list(data_modes))
+    if oceans:
+        mask &= index["ocean"].isin(list(oceans))
+    if updated_since is not None:
+        mask &= index["date_update"] >= pd.Timestamp(updated_since)
+    return index[mask.fillna(False)]
+
+
+def _fetch(file_url, dest, updated):
+    """Download one file unless an up-to-date copy exists; returns dest."""
+    if dest.exists() and (pd.isna(updated) or pd.Timestamp(dest.stat().st_mtime, unit="s") >= updated):
+        return dest
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dest.with_suffix(dest.suffix + ".part")
+    if _is_remote(file_url):
+        with requests.get(file_url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(tmp, "wb") as f:
+                for chunk in r.iter_content(chunk_size=1 << 16):
+                    f.write(chunk)
+    else:
+        shutil.copyfile(_local_path(file_url), tmp)
+    os.replace(tmp, dest)
+    return dest
+
+
+def download_selected(rows, dest_dir, base_url=GDAC_URL, workers=DOWNLOAD_WORKERS):
+    """Fetch the files listed in rows (from select) into dest_dir, keeping the dac/ layout.
+
+    Returns the local paths of the files that are present afterwards; failed
+    downloads are reported and skipped.
+    """
+    dest_dir = Path(dest_dir)
+    base = str(base_url).rstrip("/") + "/dac/"
+    jobs = [(base + f, dest_dir / f, u) for f, u in zip(rows["file"], rows["date_update"])]
+    paths = []
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [(pool.submit(_fetch, *job), job[0]) for job in jobs]
+        for future, url in futures:
+            try:
+                paths.append(future.result())
+            except Exception as e:
+                print(f"  !! download failed for {url}: {e}")
+    return paths
+
+
+def index_location(base_url=GDAC_URL):
+    return str(base_url).rstrip("/") + "/" + INDEX_NAME
@@ -0,0 +1,120 @@
+"""In-process instrumentation for the agent graph.
+
+Histograms are kept in memory and rendered in the Prometheus text format
+for the /metrics endpoint. Every observation made while a request trace is
+active is also appended to that trace, so a single request can be returned
+as a JSON timeline.
+"""
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 60, 120)
+SIZE_BUCKETS = (100, 500, 1000, 5000, 10000, 50000, 100000, 500000)
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, 1000000)
+
+_registry = []
+_trace = contextvars.ContextVar("trace", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}   # label values -> [bucket counts..., count, sum]
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(n, "")) for n in self.labelnames)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+        trace = _trace.get()
+        if trace is not None:
+            trace.append({"metric": self.name, "value": value, "at": time.time(), **labels})
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            labels = list(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_fmt_labels(labels, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_fmt_labels(labels, [('le', '+Inf')])} {series[-2]}")
+            lines.append(f"{self.name}_count{_fmt_labels(labels)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_fmt_labels(labels)} {series[-1]}")
+        return "\n".join(lines)
+
+
+def render():
+    """All registered metrics in the Prometheus text exposition format."""
+    return "\n".join(m.render() for m in _registry) + "\n"
+
+### METRICS
+
+NODE_SECONDS = Histogram("floatchat_node_seconds", "Wall time per graph node.", ["node"])
+REQUEST_SECONDS = Histogram("floatchat_request_seconds", "Wall time per chat request.")
+LLM_SECONDS = Histogram("floatchat_llm_seconds", "Total TextAgent.gen time.", ["agent"])
+LLM_TTFT_SECONDS = Histogram("floatchat_llm_ttft_seconds", "Time to first streamed token.", ["agent"])
+LLM_PROMPT_CHARS = Histogram("floatchat_llm_prompt_chars", "Prompt size in characters.", ["agent"], SIZE_BUCKETS)
+LLM_RESPONSE_CHARS = Histogram("floatchat_llm_response_chars", "Response size in characters.", ["agent"], SIZE_BUCKETS)
+LLM_TRUNCATED_CHARS = Histogram("floatchat_llm_truncated_chars", "Partial response size of generations cut short by the deadline.",
+                                ["agent"], SIZE_BUCKETS)
+SQL_SECONDS = Histogram("floatchat_sql_seconds", "SQL execute + fetch time.")
+SQL_ROWS = Histogram("floatchat_sql_rows", "Rows returned per SQL query.", buckets=ROW_BUCKETS)
+SANDBOX_SECONDS = Histogram("floatchat_sandbox_seconds", "Daytona sandbox operation time.", ["op"])
+RENDER_SECONDS = Histogram("floatchat_render_seconds", "In-process chart render time.", ["kind"])
+
+### TIMING HELPERS
+
+@contextmanager
+def timed(histogram, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def instrument_node(name, fn):
+    """Wrap a graph node so each call is timed under its node name."""
+    @functools.wraps(fn)
+    def wrapper(state):
+        with timed(NODE_SECONDS, node=name):
+            return fn(state)
+    return wrapper
+
+### REQUEST TRACES
+
+def start_trace():
+    """Begin collecting observations for the current request; returns the trace list."""
+    trace = []
+    _trace.set(trace)
+    return trace
+
+
+def stop_trace():
+    _trace.set(None)
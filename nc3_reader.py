@@ -0,0 +1,209 @@
+"""Minimal NetCDF-3 (classic and 64-bit offset) reader for Argo profile files.
+
+Parses only the file header, then exposes each variable as a zero-copy
+NumPy view into a memory map of the file: fixed-size variables at their
+begin offset, record variables (N_HISTORY in Argo files) as a strided view
+across records. No CF decoding happens here; fill values are left to the
+decoder in argo_params.
+
+Anything this reader does not handle (NetCDF-4/HDF5, CDF-5, packed
+variables) raises UnsupportedFormat so callers can fall back to xarray.
+"""
+import mmap
+import struct
+
+import numpy as np
+
+NC_DIMENSION = 0x0A
+NC_VARIABLE = 0x0B
+NC_ATTRIBUTE = 0x0C
+STREAMING = 0xFFFFFFFF
+
+NC_TYPES = {
+    1: np.dtype("i1"),      # NC_BYTE
+    2: np.dtype("S1"),      # NC_CHAR
+    3: np.dtype(">i2"),     # NC_SHORT
+    4: np.dtype(">i4"),     # NC_INT
+    5: np.dtype(">f4"),     # NC_FLOAT
+    6: np.dtype(">f8"),     # NC_DOUBLE
+}
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+class Variable:
+    def __init__(self, name, dims, shape, dtype, attrs, begin, is_record):
+        self.name = name
+        self.dims = dims
+        self.shape = shape
+        self.dtype = dtype
+        self.attrs = attrs
+        self.begin = begin
+        self.is_record = is_record
+
+
+class _Header:
+    def __init__(self, buf, offset_size):
+        self.buf = buf
+        self.pos = 4
+        self.offset_size = offset_size
+
+    def int(self):
+        (v,) = struct.unpack_from(">I", self.buf, self.pos)
+        self.pos += 4
+        return v
+
+    def offset(self):
+        fmt = ">Q" if self.offset_size == 8 else ">I"
+        (v,) = struct.unpack_from(fmt, self.buf, self.pos)
+        self.pos += self.offset_size
+        return v
+
+    def name(self):
+        n = self.int()
+        s = bytes(self.buf[self.pos:self.pos + n]).decode("utf-8")
+        self.pos += (n + 3) & ~3
+        return s
+
+    def values(self, nc_type, n):
+        dtype = NC_TYPES[nc_type]
+        size = dtype.itemsize * n
+        raw = bytes(self.buf[self.pos:self.pos + size])
+        self.pos += (size + 3) & ~3
+        if nc_type == 2:
+            return raw.rstrip(b"\x00").decode("latin-1")
+        return np.frombuffer(raw, dtype=dtype)
+
+    def attrs(self):
+        tag, n = self.int(), self.int()
+        if tag not in (0, NC_ATTRIBUTE):
+            raise UnsupportedFormat(f"unexpected attribute tag {tag:#x}")
+        out = {}
+        for _ in range(n):
+            name = self.name()
+            nc_type = self.int()
+            out[name] = self.values(nc_type, self.int())
+        return out
+
+
+class NC3File:
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        try:
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:          # empty file
+            self._file.close()
+            raise UnsupportedFormat("empty file")
+        try:
+            self._parse()
+        except (UnsupportedFormat, struct.error, KeyError, UnicodeDecodeError) as e:
+            self.close()
+            if isinstance(e, UnsupportedFormat):
+                raise
+            raise UnsupportedFormat(f"unreadable header: {e}") from e
+
+    def _parse(self):
+        magic = self._mm[:4]
+        if magic[:3] != b"CDF" or magic[3] not in (1, 2):
+            raise UnsupportedFormat(f"not NetCDF-3 classic/64-bit offset (magic {magic!r})")
+        h = _Header(self._mm, 4 if magic[3] == 1 else 8)
+
+        numrecs = h.int()
+        tag, n = h.int(), h.int()
+        if tag not in (0, NC_DIMENSION):
+            raise UnsupportedFormat(f"unexpected dimension tag {tag:#x}")
+        self.dims = {}
+        record_dim = None
+        for _ in range(n):
+            name, length = h.name(), h.int()
+            if length == 0:
+                record_dim = name
+            self.dims[name] = length
+        self.attrs = h.attrs()
+
+        tag, n = h.int(), h.int()
+        if tag not in (0, NC_VARIABLE):
+            raise UnsupportedFormat(f"unexpected variable tag {tag:#x}")
+        dim_names = list(self.dims)
+        self.variables = {}
+        record_vsizes = []
+        for _ in range(n):
+            name = h.name()
+            dims = tuple(dim_names[h.int()] for _ in range(h.int()))
+            attrs = h.attrs()
+            nc_type = h.int()
+            if nc_type not in NC_TYPES:
+                raise UnsupportedFormat(f"unsupported type {nc_type} for {name}")
+            vsize = h.int()
+            begin = h.offset()
+            if "scale_factor" in attrs or "add_offset" in attrs:
+                raise UnsupportedFormat(f"packed variable {name}")
+            is_record = bool(dims) and dims[0] == record_dim
+            shape = tuple(self.dims[d] for d in dims)
+            self.variables[name] = Variable(name, dims, shape, NC_TYPES[nc_type], attrs, begin, is_record)
+            if is_record:
+                record_vsizes.append(vsize)
+
+        if numrecs == STREAMING:
+            raise UnsupportedFormat("streaming numrecs")
+        if record_dim is not None:
+            self.dims[record_dim] = numrecs
+        # A lone record variable is not padded to a 4-byte boundary.
+        if len(record_vsizes) == 1:
+            rec = [v for v in self.variables.values() if v.is_record][0]
+            self.recsize = rec.dtype.itemsize * int(np.prod(rec.shape[1:]))
+        else:
+            self.recsize = sum(record_vsizes)
+        self.numrecs = numrecs
+
+    def array(self, name):
+        """Zero-copy view of a variable's data."""
+        v = self.variables[name]
+        if not v.is_record:
+            count = int(np.prod(v.shape)) if v.shape else 1
+            if v.begin + count * v.dtype.itemsize > len(self._mm):
+                raise UnsupportedFormat(f"{name} extends past end of file")
+            return np.frombuffer(self._mm, dtype=v.dtype, count=count, offset=v.begin).reshape(v.shape)
+        sub = v.shape[1:]
+        if self.numrecs == 0:
+            return np.zeros((0,) + sub, dtype=v.dtype)
+        inner = tuple(int(np.prod(sub[i + 1:])) * v.dtype.itemsize for i in range(len(sub)))
+        if v.begin + (self.numrecs - 1) * self.recsize + int(np.prod(sub)) * v.dtype.itemsize > len(self._mm):
+            raise UnsupportedFormat(f"{name} extends past end of file")
+        return np.ndarray((self.numrecs,) + sub, dtype=v.dtype, buffer=self._mm,
+                          offset=v.begin, strides=(self.recsize,) + inner)
+
+    def arrays(self, names, dim=None, index=slice(None)):
+        """Views of the variables present among names (matched case-insensitively), keyed lower-case.
+
+        If dim is given, each variable having that dimension is sliced with
+        index along it, still without copying.
+        """
+        lookup = {n.lower(): n for n in self.variables}
+        out = {}
+        for want in names:
+            name = lookup.get(want.lower())
+            if name is None:
+                continue
+            a = self.array(name)
+            if dim is not None and dim in self.variables[name].dims:
+                sl = [slice(None)] * a.ndim
+                sl[self.variables[name].dims.index(dim)] = index
+                a = a[tuple(sl)]
+            out[want.lower()] = a
+        return out
+
+    def close(self):
+        try:
+            self._mm.close()
+        except BufferError:
+            pass        # views still alive; the map is released when they are collected
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,27 +1,35 @@
 import os
+import argparse
 import requests
 from bs4 import BeautifulSoup
 from pathlib import Path
+import numpy as np
 import pandas as pd
 import xarray as xr
 from sqlalchemy import (
-    create_engine, Column, Integer, String, Float, DateTime, ForeignKey, Text
+    create_engine, event, Column, Integer, String, Float, DateTime, ForeignKey, Index, Text, insert, inspect, text
 )
 from sqlalchemy.orm import declarative_base, sessionmaker, relationship
-import json
+from argo_params import PARAMS, ProfileBatch, decode_profiles, feature_rows, needed_variables, trajectory_rows
+from nc3_reader import NC3File, UnsupportedFormat
+import regions
+import teos10
+from gdac_index import GDAC_URL, read_index, select, download_selected, index_location
 
 # ---------- CONFIG ----------
 URL = "https://www.ncei.noaa.gov/data/oceans/argo/gadr/data/atlantic/2020/02/"
 ARGO_DIR = Path("argo_data")             # folder to save downloaded files
 CONNECTION_URL = "sqlite:///app.db"     # database
+MAX_CHUNK_MB = float(os.getenv("ARGO_MAX_CHUNK_MB", 64))   # memory ceiling per decoded chunk
+NATIVE_READER = os.getenv("ARGO_NATIVE_READER", "1") == "1"  # mmap NetCDF-3 reader, xarray fallback
+JOURNAL_MODE = os.getenv("ARGO_JOURNAL_MODE", "wal")    # "delete" restores the rollback journal
+COMMIT_ROWS = int(os.getenv("ARGO_COMMIT_ROWS", 50_000))  # observations per write transaction
+CHECKPOINT_EVERY = int(os.getenv("ARGO_CHECKPOINT_EVERY", 10))  # commits between passive checkpoints
 # ---------------------------
 
 os.makedirs(ARGO_DIR, exist_ok=True)
 Base = declarative_base()
 
-def as_json(v):
-    return json.dumps(v if isinstance(v, (list, tuple)) else [v])
-
 # ---------- MODELS ----------
 class Data(Base):
     __tablename__ = "Data"
@@ -39,6 +47,8 @@ class Data(Base):
     latitude = Column(Float)
     longitude = Column(Float)
     position_system = Column(String)
+    basin_code = Column(Integer, index=True)    # Region.code of the ocean basin
+    region_code = Column(Integer, index=True)   # Region.code of the marginal sea, else the basin
     observations = relationship("Observation", back_populates="data", cascade="all, delete-orphan")
 
 class Observation(Base):
@@ -55,6 +65,183 @@ class Observation(Base):
     history_software = Column(Text)
     data = relationship("Data", back_populates="observations")
 
+class Region(Base):
+    """Lookup for Data.basin_code / Data.region_code, loaded from regions.json."""
+    __tablename__ = "Region"
+    code = Column(Integer, primary_key=True)
+    name = Column(String)
+    basin_code = Column(Integer)
+
+class Trajectory(Base):
+    """One row per profile, maintained at ingest: a float's life is a range read on platform_number."""
+    __tablename__ = "Trajectory"
+    data_id = Column(Integer, ForeignKey("Data.id", ondelete="CASCADE"), primary_key=True)
+    platform_number = Column(Integer)
+    cycle_num = Column(Integer)
+    juld = Column(DateTime)
+    latitude = Column(Float)
+    longitude = Column(Float)
+    surface_pressure = Column(Float)    # pressure of the shallowest valid level
+    surface_temp = Column(Float)
+    surface_psal = Column(Float)
+    min_pressure = Column(Float)
+    max_pressure = Column(Float)
+    n_levels = Column(Integer)
+
+TRAJECTORY_COLUMNS = [c.name for c in Trajectory.__table__.columns]
+# Covering indexes: per-float history and per-time lookups never touch the table rows.
+Index("ix_trajectory_float", Trajectory.platform_number, Trajectory.cycle_num,
+      *[Trajectory.__table__.c[c] for c in TRAJECTORY_COLUMNS if c not in ("platform_number", "cycle_num")])
+Index("ix_trajectory_juld", Trajectory.juld, Trajectory.platform_number, Trajectory.latitude,
+      Trajectory.longitude, Trajectory.surface_temp, Trajectory.surface_psal, Trajectory.data_id)
+class ProfileFeatures(Base):
+    """Per-profile characteristics computed once at ingest, so profile questions skip Observation."""
+    __tablename__ = "ProfileFeatures"
+    data_id = Column(Integer, ForeignKey("Data.id", ondelete="CASCADE"), primary_key=True)
+    min_pressure = Column(Float)
+    max_pressure = Column(Float)
+    surface_temp = Column(Float)
+    surface_psal = Column(Float)
+    bottom_temp = Column(Float)
+    bottom_psal = Column(Float)
+    mixed_layer_depth = Column(Float, index=True)   # dbar, 0.2 degC criterion from 10 dbar
+    thermocline_depth = Column(Float, index=True)   # dbar, strongest temperature decrease
+    qc_pass_ratio = Column(Float, index=True)       # good (QC 1/2) share of present values
+
+FEATURE_COLUMNS = [c.name for c in ProfileFeatures.__table__.columns]
+Index("ix_profilefeatures_max_pressure", ProfileFeatures.max_pressure)
+Index("ix_data_platform_cycle", Data.platform_number, Data.cycle_num)
+Index("ix_data_juld", Data.juld)
+
+# Every registered parameter beyond the core three (BGC etc.) gets a nullable REAL column.
+for _p in PARAMS.values():
+    if not hasattr(Observation, _p.column):
+        setattr(Observation, _p.column, Column(Float))
+# TEOS-10 derived variables, filled at ingest (or by --backfill) when gsw is installed.
+for _column in teos10.DERIVED:
+    setattr(Observation, _column, Column(Float))
+
+def ensure_columns(engine):
+    """Add model columns missing from existing Data/Observation tables (new parameters, derived values)."""
+    with engine.begin() as conn:
+        for table in (Data.__table__, Observation.__table__):
+            existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(f'ALTER TABLE "{table.name}" ADD COLUMN "{column.name}" '
+                                      f'{column.type.compile(engine.dialect)}'))
+
+def sync_regions(engine):
+    """Refresh the Region lookup from regions.json."""
+    with engine.begin() as conn:
+        conn.execute(Region.__table__.delete())
+        conn.execute(insert(Region), [{"code": c, "name": n, "basin_code": b} for c, n, b in regions.region_table()])
+
+def ensure_indexes(engine):
+    """Create indexes declared after a table already existed (create_all skips those)."""
+    for table in (Data.__table__, Trajectory.__table__, ProfileFeatures.__table__):
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+
+def backfill_trajectory(engine):
+    """Fill Trajectory for profiles ingested before it existed; returns the number of rows added."""
+    surface = """(SELECT o.{col} FROM Observation o WHERE o.data_id = d.id
+                  AND o.pressure IS NOT NULL AND o.{col} IS NOT NULL ORDER BY o.pressure LIMIT 1)"""
+    sql = f"""
+        INSERT INTO Trajectory ({", ".join(TRAJECTORY_COLUMNS)})
+        SELECT d.id, d.platform_number, d.cycle_num, d.juld, d.latitude, d.longitude,
+               {surface.format(col="pressure")}, {surface.format(col="temp")}, {surface.format(col="psal")},
+               (SELECT MIN(pressure) FROM Observation WHERE data_id = d.id),
+               (SELECT MAX(pressure) FROM Observation WHERE data_id = d.id),
+               (SELECT COUNT(*) FROM Observation WHERE data_id = d.id)
+        FROM Data d WHERE d.id NOT IN (SELECT data_id FROM Trajectory)"""
+    with engine.begin() as conn:
+        return conn.execute(text(sql)).rowcount
+
+BACKFILL_PROFILES = 2000
+
+def backfill_features(engine, chunk=BACKFILL_PROFILES):
+    """Compute ProfileFeatures for profiles that lack them from the stored levels.
+
+    QC flags are not kept in Observation, so qc_pass_ratio stays NULL for
+    backfilled rows. Returns the number of rows added.
+    """
+    added = 0
+    while True:
+        with engine.connect() as conn:
+            ids = np.array([r[0] for r in conn.execute(text(
+                "SELECT id FROM Data WHERE id NOT IN (SELECT data_id FROM ProfileFeatures) ORDER BY id LIMIT :n"),
+                {"n": int(chunk)})], dtype=np.int64)
+            if not len(ids):
+                return added
+            obs = pd.read_sql(text("""
+                SELECT data_id, pressure, temp, psal FROM Observation
+                WHERE data_id BETWEEN :lo AND :hi ORDER BY data_id, id"""), conn,
+                params={"lo": int(ids[0]), "hi": int(ids[-1])})
+        obs = obs[obs["data_id"].isin(ids)]
+        prof = np.searchsorted(ids, obs["data_id"].to_numpy())
+        level = obs.groupby("data_id").cumcount().to_numpy()
+        values = {}
+        for column in ("pressure", "temp", "psal"):
+            a = np.full((len(ids), level.max() + 1 if len(level) else 1), np.nan)
+            a[prof, level] = obs[column].to_numpy(dtype=float, na_value=np.nan)
+            values[column] = a
+        rows = feature_rows(ProfileBatch([{}] * len(ids), values, {}, {}))
+        for data_id, row in zip(ids, rows):
+            row["data_id"] = int(data_id)
+        with engine.begin() as conn:
+            conn.execute(insert(ProfileFeatures), rows)
+        added += len(rows)
+
+def backfill_regions(engine, chunk=BACKFILL_PROFILES * 10):
+    """Classify stored profiles that have no region yet; returns the number of rows updated."""
+    update = text("UPDATE Data SET basin_code = :basin_code, region_code = :region_code WHERE id = :id")
+    last, updated = 0, 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(text("""
+                SELECT id, latitude, longitude FROM Data
+                WHERE id > :last AND region_code IS NULL ORDER BY id LIMIT :n"""),
+                {"last": last, "n": int(chunk)}).fetchall()
+        if not rows:
+            return updated
+        last = rows[-1][0]
+        ids, lat, lon = zip(*rows)
+        basin, region = regions.classify(np.array(lat, dtype=np.float64), np.array(lon, dtype=np.float64))
+        with engine.begin() as conn:
+            conn.execute(update, [{"id": i, "basin_code": int(b), "region_code": int(r)}
+                                  for i, b, r in zip(ids, basin, region)])
+        updated += len(rows)
+
+BACKFILL_LEVELS = 200_000
+
+def backfill_teos10(engine, chunk=BACKFILL_LEVELS):
+    """Fill the TEOS-10 columns of stored levels that lack them; returns the number of levels updated."""
+    if not teos10.available():
+        print("gsw is not installed; skipping TEOS-10 backfill")
+        return 0
+    columns = list(teos10.DERIVED)
+    update = text(f"UPDATE Observation SET {', '.join(f'{c} = :{c}' for c in columns)} WHERE id = :id")
+    last, updated = 0, 0
+    while True:
+        with engine.connect() as conn:
+            obs = pd.read_sql(text("""
+                SELECT o.id, o.pressure, o.temp, o.psal, d.latitude, d.longitude
+                FROM Observation o JOIN Data d ON d.id = o.data_id
+                WHERE o.id > :last AND o.density IS NULL ORDER BY o.id LIMIT :n"""), conn,
+                params={"last": last, "n": int(chunk)})
+        if obs.empty:
+            return updated
+        last = int(obs["id"].iloc[-1])
+        derived = pd.DataFrame(teos10.derive(obs["pressure"], obs["temp"], obs["psal"],
+                                             obs["latitude"], obs["longitude"]))
+        derived["id"] = obs["id"].to_numpy()
+        derived = derived[derived["density"].notna()]
+        if len(derived):
+            with engine.begin() as conn:
+                conn.execute(update, derived.astype(object).where(derived.notna(), None).to_dict("records"))
+        updated += len(derived)
+
 # ---------- HELPERS ----------
 def download_argo_files():
     """Download all .nc files from the NOAA Argo directory into ARGO_DIR."""
@@ -79,134 +266,257 @@ def download_argo_files():
                 for chunk in r.iter_content(chunk_size=8192):
                     f.write(chunk)
 
-def parse_qc(series: pd.Series) -> pd.Series:
-    return pd.to_numeric(series.astype(str).str.extract(r'(\d)').squeeze(), errors="coerce")
+def read_profiles(nc_path):
+    """Decode every profile of a file in one vectorized pass into a ProfileBatch."""
+    if NATIVE_READER:
+        try:
+            with NC3File(nc_path) as nc:
+                return decode_profiles(nc.arrays(needed_variables()))
+        except UnsupportedFormat:
+            pass
+    with xr.open_dataset(nc_path) as DS:
+        names = {name.lower(): name for name in DS.variables}
+        arrays = {var: DS[names[var]].values for var in needed_variables() if var in names}
+    return decode_profiles(arrays)
+
+# decoded float64 values, QC, merge temporaries and the observation frame per raw byte
+DECODE_OVERHEAD = 6
+
+def profiles_per_chunk(DS, variables, prof_dim, max_chunk_mb=MAX_CHUNK_MB):
+    """How many profiles fit in max_chunk_mb once read and decoded."""
+    per_profile = 0
+    for name in variables:
+        var = DS[name]
+        if prof_dim in var.dims:
+            per_profile += var.dtype.itemsize * int(np.prod([DS.sizes[d] for d in var.dims if d != prof_dim]))
+    return max(1, int(max_chunk_mb * 1e6 // max(per_profile * DECODE_OVERHEAD, 1)))
+
+def iter_profile_chunks(nc_path, max_chunk_mb=MAX_CHUNK_MB, chunk_profiles=None):
+    """Yield ProfileBatches of fixed-size N_PROF slices, reading only one slice at a time.
+
+    Peak memory is bounded by the chunk size, not the file size, so large
+    GDAC aggregate files stream through. chunk_profiles overrides the size
+    derived from max_chunk_mb.
+    """
+    if NATIVE_READER:
+        try:
+            nc = NC3File(nc_path)
+        except UnsupportedFormat:
+            nc = None
+        if nc is not None:
+            with nc:
+                yield from _iter_native_chunks(nc, max_chunk_mb, chunk_profiles)
+            return
+
+    with xr.open_dataset(nc_path, cache=False) as DS:
+        names = {name.lower(): name for name in DS.variables}
+        variables = [names[var] for var in needed_variables() if var in names]
+        prof_dim = next(d for d in DS.dims if d.lower() == "n_prof")
+        n_prof = DS.sizes[prof_dim]
+        step = chunk_profiles or profiles_per_chunk(DS, variables, prof_dim, max_chunk_mb)
+        for start in range(0, n_prof, step):
+            sub = DS[variables].isel({prof_dim: slice(start, start + step)})
+            yield decode_profiles({name.lower(): sub[name].values for name in variables})
+
+def _iter_native_chunks(nc, max_chunk_mb, chunk_profiles):
+    lookup = {name.lower(): name for name in nc.variables}
+    prof_dim = next(d for d in nc.dims if d.lower() == "n_prof")
+    n_prof = nc.dims[prof_dim]
+    if chunk_profiles is None:
+        per_profile = sum(
+            v.dtype.itemsize * int(np.prod([nc.dims[d] for d in v.dims if d != prof_dim]))
+            for v in (nc.variables[lookup[var]] for var in needed_variables() if var in lookup)
+            if prof_dim in v.dims
+        )
+        chunk_profiles = max(1, int(max_chunk_mb * 1e6 // max(per_profile * DECODE_OVERHEAD, 1)))
+    for start in range(0, n_prof, chunk_profiles):
+        yield decode_profiles(nc.arrays(needed_variables(), prof_dim, slice(start, start + chunk_profiles)))
 
 def load_and_clean(nc_path: Path):
-    DS = xr.open_dataset(nc_path)
-    df = DS.to_dataframe().reset_index(drop=True)
-
-    cols = [
-        "platform_number", "project_name", "pi_name", "station_parameters", "cycle_number",
-        "data_centre", "data_mode", "float_serial_no", "firmware_version",
-        "platform_type", "juld", "latitude", "longitude", "positioning_system",
-        "pres", "pres_qc", "pres_adjusted", "pres_adjusted_qc",
-        "temp", "temp_qc", "temp_adjusted", "temp_adjusted_qc",
-        "psal", "psal_qc", "psal_adjusted", "psal_adjusted_qc",
-        "scientific_calib_equation", "scientific_calib_coefficient",
-        "scientific_calib_comment", "history_software"
-    ]
-    df = df[cols].drop_duplicates()
-
-    def dec(s):
-        return s.decode("utf-8").strip() if isinstance(s, (bytes, bytearray)) else str(s).strip()
-
-    meta = {
-        "platform_number": int(df["platform_number"].iloc[0]),
-        "project_name": dec(df["project_name"].iloc[0]),
-        "pi_name": dec(df["pi_name"].iloc[0]),
-        "cycle_num": int(df["cycle_number"].iloc[0]),
-        "data_centre": dec(df["data_centre"].iloc[0]),
-        "data_mode": dec(df["data_mode"].iloc[0]),
-        "float_no": int(df["float_serial_no"].iloc[0]),
-        "firmware": int(df["firmware_version"].iloc[0]) if str(df["firmware_version"].iloc[0]).isdigit() else None,
-        "platform_type": dec(df["platform_type"].iloc[0]),
-        "juld": pd.to_datetime(str(df["juld"].iloc[0]), errors="coerce"),
-        "latitude": float(df["latitude"].iloc[0]),
-        "longitude": float(df["longitude"].iloc[0]),
-        "position_system": dec(df["positioning_system"].iloc[0]),
-    }
-
-    # ---- QC adjustments ----
-    df["pres_qc_num"] = parse_qc(df["pres_qc"])
-    df["pres_adj_qc_num"] = parse_qc(df["pres_adjusted_qc"])
-    mask = (
-        df["pres_adjusted"].notna()
-        & df["pres_adj_qc_num"].isin([1, 2])
-        & (df["pres_qc_num"].isna() | (df["pres_adj_qc_num"] >= df["pres_qc_num"]))
-    )
-    df.loc[mask, "pres"] = df.loc[mask, "pres_adjusted"]
-
-    df["temp_qc_num"] = parse_qc(df["temp_qc"])
-    df["temp_adj_qc_num"] = parse_qc(df["temp_adjusted_qc"])
-    mask = (
-        df["temp_adjusted"].notna()
-        & df["temp_adj_qc_num"].isin([1, 2])
-        & (df["temp_qc_num"].isna() | (df["temp_adj_qc_num"] >= df["temp_qc_num"]))
-    )
-    df.loc[mask, "temp"] = df.loc[mask, "temp_adjusted"]
-
-    df["psal_qc_num"] = parse_qc(df["psal_qc"])
-    df["psal_adj_qc_num"] = parse_qc(df["psal_adjusted_qc"])
-    mask = (
-        df["psal_adjusted"].notna()
-        & df["psal_adj_qc_num"].isin([1, 2])
-        & (df["psal_qc_num"].isna() | (df["psal_adj_qc_num"] >= df["psal_qc_num"]))
-    )
-    df.loc[mask, "psal"] = df.loc[mask, "psal_adjusted"]
-
-    def to_list(col):
-        return df[col].apply(lambda x: dec(x).split() if isinstance(x, (bytes, bytearray)) else str(x).strip().split())
-
-    df['station_parameters'] = to_list('station_parameters')
-    df['scientific_calib_coefficient'] = to_list('scientific_calib_coefficient')
-    df['scientific_calib_equation']    = to_list('scientific_calib_equation')
-    df['scientific_calib_comment']     = to_list('scientific_calib_comment')
-    df['history_software']             = to_list('history_software')
-
-    obs = df.drop(columns=[
-        "platform_number", "project_name", "pi_name", "cycle_number", "data_centre", "data_mode",
-        "float_serial_no", "firmware_version", "platform_type", "juld", "latitude", "longitude", "positioning_system",
-        "pres_adjusted", "pres_qc", "pres_adjusted_qc", "pres_qc_num", "pres_adj_qc_num",
-        "temp_adjusted", "temp_qc", "temp_adjusted_qc", "temp_qc_num", "temp_adj_qc_num",
-        "psal_adjusted", "psal_qc", "psal_adjusted_qc", "psal_qc_num", "psal_adj_qc_num"
-    ], axis=1)
-
-    return meta, obs
+    """Metadata and QC-merged observations of the first profile in the file."""
+    batch = read_profiles(nc_path)
+    obs = batch.observations()
+    obs = obs[obs["prof"] == 0].drop(columns=["prof"])
+    return batch.metas[0], obs
 
-# ---------- MAIN ----------
-def main():
-    # Step 1. Download
-    download_argo_files()
+OBS_COLUMNS = [c.name for c in Observation.__table__.columns if c.name != "id"]
 
-    # Step 2. Parse + Insert
-    engine = create_engine(CONNECTION_URL, future=True)
-    Session = sessionmaker(bind=engine, expire_on_commit=False)
+def write_batch(session, batch):
+    """Insert one ProfileBatch (Data rows, then their observations); returns the observation count."""
+    basin, region = regions.classify([m["latitude"] for m in batch.metas],
+                                     [m["longitude"] for m in batch.metas])
+    rows = [Data(**meta, basin_code=int(b), region_code=int(r))
+            for meta, b, r in zip(batch.metas, basin, region)]
+    session.add_all(rows)
+    session.flush()
+    obs = batch.observations()
+    prof = obs["prof"].to_numpy()
+    obs["data_id"] = np.array([r.id for r in rows], dtype=np.int64)[prof]
+    if teos10.available() and {"pressure", "temp", "psal"} <= set(obs.columns):
+        lat = np.array([m["latitude"] for m in batch.metas], dtype=np.float64)[prof]
+        lon = np.array([m["longitude"] for m in batch.metas], dtype=np.float64)[prof]
+        for column, v in teos10.derive(obs["pressure"], obs["temp"], obs["psal"], lat, lon).items():
+            obs[column] = v
+    obs = obs[[c for c in OBS_COLUMNS if c in obs.columns]]
+    records = obs.astype(object).where(obs.notna(), None).to_dict("records")
+    if records:
+        session.execute(insert(Observation), records)
+    trajectory = trajectory_rows(batch)
+    for row, traj in zip(rows, trajectory):
+        traj["data_id"] = row.id
+    if trajectory:
+        session.execute(insert(Trajectory), trajectory)
+    features = feature_rows(batch)
+    for row, feat in zip(rows, features):
+        feat["data_id"] = row.id
+    if features:
+        session.execute(insert(ProfileFeatures), features)
+    return len(records)
 
-    files = sorted(p for p in ARGO_DIR.rglob("*.nc"))
-    if not files:
-        print(f"No .nc files found in {ARGO_DIR.resolve()}")
-        return
+# ---------- INGEST ----------
+def make_engine(connection_url=CONNECTION_URL):
+    """Engine for ingest. On SQLite it switches the file to WAL so the chat server keeps reading a
+    consistent snapshot while loads commit, and lets SQLAlchemy drive BEGIN/SAVEPOINT itself."""
+    engine = create_engine(connection_url, future=True)
+    if engine.dialect.name != "sqlite":
+        return engine
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _):
+        dbapi_conn.isolation_level = None
+        cur = dbapi_conn.cursor()
+        cur.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+        if JOURNAL_MODE.lower() == "wal":
+            cur.execute("PRAGMA synchronous=NORMAL")
+            cur.execute("PRAGMA wal_autocheckpoint=0")      # checkpoints are scheduled by checkpoint()
+        cur.close()
+
+    @event.listens_for(engine, "begin")
+    def _on_begin(conn):
+        conn.exec_driver_sql("BEGIN")
+
+    return engine
+
+def checkpoint(engine, mode="PASSIVE"):
+    """Copy committed WAL frames back into the database. PASSIVE never waits on readers."""
+    if engine.dialect.name == "sqlite" and JOURNAL_MODE.lower() == "wal":
+        with engine.connect() as conn:
+            conn.exec_driver_sql(f"PRAGMA wal_checkpoint({mode})")
+
+def ingest_files(files, connection_url=CONNECTION_URL, max_chunk_mb=MAX_CHUNK_MB, commit_rows=COMMIT_ROWS):
+    """Stream each file chunk by chunk into the database; returns the number of observations inserted.
+
+    Each file is written inside its own savepoint, so a bad file is rolled
+    back alone. Transactions are committed only between files, once about
+    commit_rows observations are pending, so a file is either fully in the
+    database or not at all.
+    """
+    engine = make_engine(connection_url)
+    Base.metadata.create_all(engine)
+    ensure_columns(engine)
+    ensure_indexes(engine)
+    sync_regions(engine)
+    Session = sessionmaker(bind=engine, expire_on_commit=False)
+    total = pending = commits = 0
 
     with Session() as session:
         for i, f in enumerate(files, 1):
+            savepoint = session.begin_nested()
             try:
                 print(f"[{i}/{len(files)}] Processing {f} ...")
-                meta, obs_df = load_and_clean(f)
-
-                data_row = Data(**meta)
-                session.add(data_row)
-                session.flush()
-
-                to_insert = []
-                for _, r in obs_df.iterrows():
-                    to_insert.append(Observation(
-                        data_id=data_row.id,
-                        pressure=float(r["pres"]) if pd.notna(r["pres"]) else None,
-                        temp=float(r["temp"]) if pd.notna(r["temp"]) else None,
-                        psal=float(r["psal"]) if pd.notna(r["psal"]) else None,
-                        station_param=as_json(r["station_parameters"]),
-                        equation=as_json(r["scientific_calib_equation"]),
-                        coefficient=as_json(r["scientific_calib_coefficient"]),
-                        comment=as_json(r["scientific_calib_comment"]),
-                        history_software=as_json(r["history_software"]),
-                    ))
-                session.bulk_save_objects(to_insert)
-                session.commit()
-                print(f"  -> inserted {len(to_insert)} observations.")
+                n = 0
+                for batch in iter_profile_chunks(f, max_chunk_mb):
+                    n += write_batch(session, batch)
+                savepoint.commit()
             except Exception as e:
-                session.rollback()
-                print(f"  !! error on {f.name}: {e}")
+                savepoint.rollback()
+                print(f"  !! error on {Path(f).name}: {e}")
+                continue
+            total, pending = total + n, pending + n
+            print(f"  -> inserted {n} observations.")
+            if pending >= commit_rows:
+                session.commit()
+                session.expunge_all()
+                pending, commits = 0, commits + 1
+                if commits % CHECKPOINT_EVERY == 0:
+                    checkpoint(engine)
+        session.commit()
+    checkpoint(engine, "TRUNCATE")
+    engine.dispose()
+    return total
+
+# ---------- MAIN ----------
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download Argo profile files and ingest them into the database.")
+    sel = parser.add_argument_group("selective download from the GDAC profile index")
+    sel.add_argument("--index", help=f"index file path or URL (default: {INDEX_HINT})")
+    sel.add_argument("--gdac-url", default=GDAC_URL, help="GDAC root (http(s) URL or local mirror) holding dac/")
+    sel.add_argument("--bbox", help="lat_min,lat_max,lon_min,lon_max (lon_min > lon_max crosses the dateline)")
+    sel.add_argument("--start", help="first profile date, e.g. 2020-01-01")
+    sel.add_argument("--end", help="profile date upper bound (exclusive)")
+    sel.add_argument("--platform", help="comma separated WMO platform numbers")
+    sel.add_argument("--mode", help="data modes to keep, e.g. D or RAD")
+    sel.add_argument("--ocean", help="index ocean codes to keep, e.g. I or AIP")
+    sel.add_argument("--updated-since", help="only files updated on/after this date")
+    parser.add_argument("--max-chunk-mb", type=float, default=MAX_CHUNK_MB)
+    parser.add_argument("--workers", type=int, default=1,
+                        help="ingest into this many shard databases in parallel, then merge them (see shard_ingest.py)")
+    parser.add_argument("--backfill", action="store_true",
+                        help="only fill derived tables/columns (Trajectory, ProfileFeatures, TEOS-10, regions) for rows already in the database")
+    return parser.parse_args()
+
+INDEX_HINT = "<gdac-url>/ar_index_global_prof.txt"
+
+def main():
+    args = parse_args()
+    if args.backfill:
+        engine = make_engine(CONNECTION_URL)
+        Base.metadata.create_all(engine)
+        ensure_columns(engine)
+        ensure_indexes(engine)
+        sync_regions(engine)
+        print(f"Trajectory: {backfill_trajectory(engine)} rows added")
+        print(f"ProfileFeatures: {backfill_features(engine)} rows added")
+        print(f"TEOS-10: {backfill_teos10(engine)} levels updated")
+        print(f"Regions: {backfill_regions(engine)} profiles classified")
+        engine.dispose()
+        return
+    selective = args.index or any([args.bbox, args.start, args.end, args.platform, args.mode,
+                                   args.ocean, args.updated_since])
+
+    # Step 1. Download
+    if selective:
+        index = read_index(args.index or index_location(args.gdac_url))
+        rows = select(
+            index,
+            bbox=tuple(float(x) for x in args.bbox.split(",")) if args.bbox else None,
+            start=args.start,
+            end=args.end,
+            platforms=args.platform.split(",") if args.platform else None,
+            data_modes=args.mode,
+            oceans=args.ocean,
+            updated_since=args.updated_since,
+        )
+        print(f"{len(rows)} of {len(index)} indexed profiles match the selection")
+        files = sorted(download_selected(rows, ARGO_DIR, args.gdac_url))
+    else:
+        download_argo_files()
+        files = sorted(p for p in ARGO_DIR.rglob("*.nc"))
+
+    # Step 2. Parse + Insert
+    if not files:
+        print(f"No .nc files found in {ARGO_DIR.resolve()}")
+        return
+    if args.workers > 1:
+        import shard_ingest
+        db = CONNECTION_URL.removeprefix("sqlite:///")
+        shards = shard_ingest.ingest_shards(files, args.workers, max_chunk_mb=args.max_chunk_mb)
+        # merge() keeps the profiles already in db, like the single-process ingest
+        print(f"{shard_ingest.merge(shards, db)} profiles in {db}")
+        for path in shards:
+            Path(path).unlink(missing_ok=True)
+        return
+    ingest_files(files, max_chunk_mb=args.max_chunk_mb)
 
 if __name__ == "__main__":
     main()
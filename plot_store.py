@@ -0,0 +1,156 @@
+"""Content-addressed store for rendered plots.
+
+A plot is keyed by the SHA-256 of the SQL result it was drawn from and the
+code that drew it, so asking the same question over the same data serves
+the stored image instead of re-running the sandbox. Images live on disk as
+<root>/<key[:2]>/<key>.<ext>, downscaled thumbnails next to them, and the
+least recently used files are evicted once the store exceeds its budget.
+"""
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+PLOT_DIR = os.getenv("PLOT_DIR", "plots")
+PLOT_CACHE_MB = float(os.getenv("PLOT_CACHE_MB", 256))
+THUMB_WIDTHS = (128, 256, 512)
+
+CONTENT_TYPES = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def plot_key(rows, columns, code):
+    """SHA-256 hex of (columns, rows, plot code); rows are hashed one at a time."""
+    h = hashlib.sha256()
+    h.update(json.dumps(list(columns), default=str).encode())
+    for row in rows:
+        h.update(b"\n")
+        h.update(json.dumps(list(row), default=str).encode())
+    h.update(b"\0")
+    h.update(str(code).encode())
+    return h.hexdigest()
+
+
+def sniff(data):
+    """File extension for raw image bytes."""
+    head = bytes(data[:256]).lstrip()
+    if head.startswith(b"\x89PNG"):
+        return "png"
+    if head.startswith(b"<svg") or (head.startswith(b"<?xml") and b"<svg" in bytes(data[:1024])):
+        return "svg"
+    raise ValueError("not a PNG or SVG image")
+
+
+class PlotStore:
+    def __init__(self, root=PLOT_DIR, max_bytes=PLOT_CACHE_MB * 1e6):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._files = {}        # path -> (size, last_used)
+        self.hits = 0
+        self.misses = 0
+        if self.root.exists():
+            for p in self.root.glob("*/*"):
+                if p.suffix != ".part":
+                    st = p.stat()
+                    self._files[p] = (st.st_size, st.st_mtime)
+
+    def _path(self, key, ext, width=None):
+        name = key if width is None else f"{key}.w{width}"
+        return self.root / key[:2] / f"{name}.{ext}"
+
+    def _find(self, key):
+        for ext in CONTENT_TYPES:
+            p = self._path(key, ext)
+            if p in self._files:
+                return p
+        return None
+
+    def _touch(self, path):
+        size, _ = self._files[path]
+        self._files[path] = (size, time.time())
+
+    def __contains__(self, key):
+        with self._lock:
+            return self._find(key) is not None
+
+    def lookup(self, key):
+        """Mark a plot as used; True if it is stored."""
+        with self._lock:
+            p = self._find(key)
+            if p is None:
+                self.misses += 1
+                return False
+            self._touch(p)
+            self.hits += 1
+            return True
+
+    def put(self, key, data):
+        """Store image bytes under key; returns the extension."""
+        ext = sniff(data)
+        path = self._path(key, ext)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(path.suffix + ".part")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._files[path] = (len(data), time.time())
+            self._evict()
+        return ext
+
+    def get(self, key, width=None):
+        """(bytes, content type) of a plot or of its thumbnail at width, or None if not stored.
+
+        Thumbnails are made on first request for PNGs; SVGs scale by themselves
+        and are returned as is.
+        """
+        with self._lock:
+            path = self._find(key)
+            if path is None:
+                return None
+            ext = path.suffix[1:]
+            if width is not None and ext == "png":
+                width = min(THUMB_WIDTHS, key=lambda w: abs(w - width))
+                thumb = self._path(key, ext, width)
+                if thumb in self._files:
+                    path = thumb
+                else:
+                    path = self._make_thumbnail(path, thumb, width)
+            self._touch(path)
+        try:
+            return path.read_bytes(), CONTENT_TYPES[ext]
+        except FileNotFoundError:
+            with self._lock:
+                self._files.pop(path, None)
+            return None
+
+    def _make_thumbnail(self, src, dest, width):
+        from PIL import Image
+        with Image.open(src) as im:
+            if im.width <= width:
+                return src
+            im.thumbnail((width, max(1, round(im.height * width / im.width))))
+            buf = io.BytesIO()
+            im.save(buf, format="PNG", optimize=True)
+        dest.write_bytes(buf.getvalue())
+        self._files[dest] = (len(buf.getvalue()), time.time())
+        self._evict()
+        return dest
+
+    def size(self):
+        with self._lock:
+            return sum(s for s, _ in self._files.values())
+
+    def _evict(self):
+        total = sum(s for s, _ in self._files.values())
+        for path, (size, _) in sorted(self._files.items(), key=lambda kv: kv[1][1]):
+            if total <= self.max_bytes:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            del self._files[path]
+            total -= size
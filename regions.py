@@ -0,0 +1,89 @@
+"""Ocean basin / marginal sea classification of profile positions.
+
+Outlines come from regions.json (coarse polygons, good to a few tens of
+km near coasts, which is finer than a hand-written lat/lon box). Every
+position gets a basin_code (Atlantic 1, Pacific 2, Indian 3, Southern 4,
+Arctic 5) and a region_code, the marginal sea code (basin * 100 + n)
+where one matches, else the basin code. 0 means unknown position.
+"""
+import json
+from pathlib import Path
+
+REGIONS_PATH = Path(__file__).with_name("regions.json")
+UNKNOWN = 0
+
+_features = None
+
+
+def _load():
+    global _features
+    if _features is None:
+        with open(REGIONS_PATH) as f:
+            _features = json.load(f)["features"]
+    return _features
+
+
+def region_table():
+    """[(code, name, basin_code)] for every region, including UNKNOWN."""
+    rows = [(UNKNOWN, "Unknown", UNKNOWN)]
+    rows += [(f["properties"]["code"], f["properties"]["name"], f["properties"]["basin_code"]) for f in _load()]
+    return rows
+
+
+def contains(ring, lon, lat):
+    """Even-odd point-in-polygon test of many points against one ring, vectorized over the points."""
+    import numpy as np
+    xs, ys = np.asarray(ring, dtype=np.float64).T
+    inside = np.zeros(lon.shape, dtype=bool)
+    box = (lon >= xs.min()) & (lon <= xs.max()) & (lat >= ys.min()) & (lat <= ys.max())
+    if not box.any():
+        return inside
+    px, py = lon[box], lat[box]
+    hit = np.zeros(px.shape, dtype=bool)
+    for x1, y1, x2, y2 in zip(xs[:-1], ys[:-1], xs[1:], ys[1:]):
+        if y1 == y2:
+            continue
+        crosses = (y1 > py) != (y2 > py)
+        hit ^= crosses & (px < (x2 - x1) * (py - y1) / (y2 - y1) + x1)
+    inside[box] = hit
+    return inside
+
+
+def classify(latitude, longitude):
+    """Arrays of latitude/longitude (NaN allowed) -> (basin_code, region_code) int arrays."""
+    import numpy as np
+    lat = np.asarray(latitude, dtype=np.float64).reshape(-1)
+    lon = (np.asarray(longitude, dtype=np.float64).reshape(-1) + 180.0) % 360.0 - 180.0
+    known = np.isfinite(lat) & np.isfinite(lon)
+    basin = np.full(lat.shape, UNKNOWN, dtype=np.int64)
+    region = np.full(lat.shape, UNKNOWN, dtype=np.int64)
+    fallback = UNKNOWN
+    for f in _load():
+        props, geom = f["properties"], f["geometry"]
+        if props["code"] != props["basin_code"]:
+            continue
+        if geom is None:
+            fallback = props["code"]
+            continue
+        hit = known & (basin == UNKNOWN) & contains(geom["coordinates"][0], lon, lat)
+        basin[hit] = props["code"]
+    basin[known & (basin == UNKNOWN)] = fallback
+    region[:] = basin
+    for f in _load():
+        props, geom = f["properties"], f["geometry"]
+        if props["code"] == props["basin_code"]:
+            continue
+        hit = known & (region == basin) & contains(geom["coordinates"][0], lon, lat)
+        region[hit] = props["code"]
+        basin[hit] = props["basin_code"]
+    return basin, region
+
+
+def describe():
+    """Region codes and names as one line for the SQL agent's prompt."""
+    lines = []
+    for code, name, basin in region_table():
+        if code == UNKNOWN:
+            continue
+        lines.append(f"{code} {name}" + ("" if code == basin else f" (basin {basin})"))
+    return "; ".join(lines)
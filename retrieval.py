@@ -0,0 +1,155 @@
+"""Cached, single-flight retrieval layer for the web and research tools.
+
+Lookups are keyed on the normalized query and kept for a per-kind TTL.
+Concurrent identical lookups share one in-flight fetch instead of each
+hitting the backend.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+WEB_TTL_S = float(os.getenv("WEB_CACHE_TTL_S", 6 * 3600))
+RESEARCH_TTL_S = float(os.getenv("RESEARCH_CACHE_TTL_S", 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv("RETRIEVAL_CACHE_MAX_ENTRIES", 512))
+
+
+def normalize_query(query):
+    """Lower-case, drop punctuation and collapse whitespace so trivially different phrasings share a key."""
+    query = re.sub(r"[^\w\s]", " ", str(query).lower())
+    return " ".join(query.split())
+
+
+class _Flight:
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class RetrievalCache:
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> (expires_at, value)
+        self._inflight = {}             # key -> _Flight
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_fetch(self, kind, query, ttl, fetch, store_if=None, timeout=None):
+        """Return the cached value for (kind, query) or fetch it once.
+
+        fetch(query) is only called by the first caller; others wait for its
+        result. store_if(value) can veto caching of e.g. truncated results.
+        Waiters give up after timeout seconds and get None.
+        """
+        key = (kind, normalize_query(query))
+        now = time.monotonic()
+        with self._lock:
+            hit = self._entries.get(key)
+            if hit is not None and hit[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return hit[1]
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = _Flight()
+                self._inflight[key] = flight
+                self.misses += 1
+
+        if not leader:
+            if not flight.event.wait(timeout):
+                return None
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            value = fetch(query)
+            flight.value = value
+            if store_if is None or store_if(value):
+                with self._lock:
+                    self._entries[key] = (time.monotonic() + ttl, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            flight.event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+### BACKENDS
+
+class ExaBackend:
+    def __init__(self, get_exa):
+        # resolved per call so the Exa client is only built on first use
+        self.get_exa = get_exa
+
+    @property
+    def exa(self):
+        return self.get_exa()
+
+    def search(self, query):
+        return self.exa.search_and_contents(
+            query,
+            text = True,
+            type = "auto",
+        )
+
+    def research(self, query, deadline=None):
+        task = self.exa.research.create(
+            instructions = query,
+            model = "exa-research",
+        )
+        parts = []
+        for event in self.exa.research.get(task.research_id, stream = True):
+            parts.append(str(event))
+            if deadline is not None and time.monotonic() > deadline:
+                print("DEADLINE HIT, RESEARCH CUT SHORT")
+                break
+        return "".join(parts)
+
+
+class StubBackend:
+    """Offline backend for tests and local runs.
+
+    Answers come from a dict of normalized query -> text, optionally loaded
+    from a JSON file. Call counts let tests assert on cache behaviour.
+    """
+    def __init__(self, results=None):
+        self.results = {normalize_query(k): v for k, v in (results or {}).items()}
+        self.search_calls = 0
+        self.research_calls = 0
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as f:
+            return cls(json.load(f))
+
+    def search(self, query):
+        self.search_calls += 1
+        return self.results.get(normalize_query(query), f"No stub results for '{query}'.")
+
+    def research(self, query, deadline=None):
+        self.research_calls += 1
+        return self.results.get(normalize_query(query), f"No stub research for '{query}'.")
+
+
+def make_backend(get_exa=None):
+    """Pick the backend from RETRIEVAL_BACKEND ('exa' or 'stub')."""
+    if os.getenv("RETRIEVAL_BACKEND", "exa") == "stub":
+        path = os.getenv("RETRIEVAL_STUB_PATH")
+        return StubBackend.from_file(path) if path else StubBackend()
+    return ExaBackend(get_exa)
@@ -0,0 +1,67 @@
+"""Lazily constructed service clients.
+
+Each client is registered as a factory and only built, and its SDK only
+imported, the first time it is asked for. Importing the app therefore needs
+neither the vendor SDKs' import time nor API keys. Tests can swap a provider
+with register() before first use.
+"""
+import os
+import threading
+
+_factories = {}
+_instances = {}
+_lock = threading.Lock()
+
+
+def register(name, factory):
+    """Register (or replace) the factory for a service and drop any built instance."""
+    with _lock:
+        _factories[name] = factory
+        _instances.pop(name, None)
+
+
+def get(name):
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def reset(name=None):
+    """Forget built clients so the next get() constructs them again."""
+    with _lock:
+        if name is None:
+            _instances.clear()
+        else:
+            _instances.pop(name, None)
+
+### PROVIDERS
+
+def _exa():
+    from exa_py import Exa
+    return Exa(api_key = os.getenv("EXA_API_KEY"))
+
+def _openai():
+    from openai import OpenAI
+    return OpenAI(
+        base_url = "https://api.exa.ai",
+        api_key = os.getenv("EXA_API_KEY"),
+    )
+
+def _daytona():
+    from daytona import Daytona, DaytonaConfig
+    return Daytona(DaytonaConfig(api_key=os.getenv("DAYTONA_API_KEY")))
+
+def _replicate():
+    # the module-level API reads REPLICATE_API_TOKEN itself
+    import replicate
+    return replicate
+
+register("exa", _exa)
+register("openai", _openai)
+register("daytona", _daytona)
+register("replicate", _replicate)
@@ -0,0 +1,209 @@
+"""Server-side conversation sessions.
+
+A session keeps its last few turns verbatim, a rolling summary of every
+older turn and the results of its recent analyse calls. Turns that drop
+out of the window are folded into the summary one at a time, so the
+context given to the Router stays the same size however long the
+conversation runs. Earlier results are offered to the SQL agent as temp
+tables, so a follow-up ("now show that for 2019") can narrow a previous
+result instead of querying the base tables again.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+SESSION_TTL_S = float(os.getenv("SESSION_TTL_S", 6 * 3600))
+SESSION_MAX = int(os.getenv("SESSION_MAX", 1000))
+KEEP_TURNS = int(os.getenv("SESSION_KEEP_TURNS", 4))
+TURN_CHARS = int(os.getenv("SESSION_TURN_CHARS", 1000))
+SUMMARY_CHARS = int(os.getenv("SESSION_SUMMARY_CHARS", 1500))
+KEEP_RESULTS = int(os.getenv("SESSION_KEEP_RESULTS", 4))
+RESULT_MAX_ROWS = int(os.getenv("SESSION_RESULT_MAX_ROWS", 50000))
+
+
+def clip(text, limit, keep="head"):
+    """text cut to at most limit characters, keeping its start ("head") or its end ("tail")."""
+    text = str(text)
+    if len(text) <= limit:
+        return text
+    return text[:limit - 3] + "..." if keep == "head" else "..." + text[-(limit - 3):]
+
+
+def _sql_key(sql):
+    return " ".join(str(sql).split()).lower()
+
+
+def fold(summary, user, assistant, summarize=None):
+    """Rolling summary extended by one turn, at most SUMMARY_CHARS long.
+
+    summarize(summary, turn) is the LLM call; without it, or when it fails,
+    the turn is appended verbatim and the oldest text is cut off.
+    """
+    turn = f"user: {user}\nassistant: {assistant}"
+    if summarize is not None:
+        try:
+            new = str(summarize(summary, turn)).strip()
+            if new:
+                return clip(new, SUMMARY_CHARS)
+        except Exception as e:
+            print("SUMMARY FAILED: ", e)
+    return clip((summary + "\n" + turn).strip(), SUMMARY_CHARS, keep="tail")
+
+
+class Session:
+    def __init__(self, sid):
+        self.id = sid
+        self.summary = ""
+        self.turns = []         # [(user, assistant)], oldest first
+        self.results = []       # recent analyse results, oldest first
+        self.last_used = time.monotonic()
+        self.lock = threading.RLock()
+        self._seq = 0
+        self._compacting = False
+
+    def messages(self, msg):
+        """Router context for a new message: summary, recent turns and the message, each clipped."""
+        with self.lock:
+            out = ["summary of earlier conversation: " + self.summary] if self.summary else []
+            for user, assistant in self.turns:
+                out += ["user: " + user, "assistant: " + assistant]
+            out.append("user: " + clip(msg, TURN_CHARS))
+            return out
+
+    def add_turn(self, user, assistant):
+        with self.lock:
+            self.turns.append((clip(user, TURN_CHARS), clip(assistant, TURN_CHARS)))
+
+    def overflow(self):
+        with self.lock:
+            return len(self.turns) > KEEP_TURNS
+
+    def compact(self, summarize=None):
+        """Fold turns beyond KEEP_TURNS into the summary, oldest first.
+
+        The summarize calls run without the lock, so requests on this session
+        are not held up by them; the folded turns stay in the window until
+        their summary is stored. Only one compaction runs at a time.
+        """
+        with self.lock:
+            if self._compacting:
+                return
+            self._compacting = True
+        try:
+            while True:
+                with self.lock:
+                    pending = self.turns[:-KEEP_TURNS] if KEEP_TURNS else list(self.turns)
+                    summary = self.summary
+                if not pending:
+                    return
+                for user, assistant in pending:
+                    summary = fold(summary, user, assistant, summarize)
+                with self.lock:
+                    # turns are only appended meanwhile, so the folded ones are still at the front
+                    del self.turns[:len(pending)]
+                    self.summary = summary
+        finally:
+            with self.lock:
+                self._compacting = False
+
+    def add_result(self, query, sql, columns, rows, img_key=None):
+        """Keep an analyse result for follow-ups; returns its entry, or None if it is too large."""
+        if len(rows) > RESULT_MAX_ROWS:
+            return None
+        with self.lock:
+            self._seq += 1
+            entry = {
+                "name": f"result_{self._seq}",
+                "query": clip(query, 200),
+                "sql": sql,
+                "columns": list(columns),
+                "rows": list(rows),
+                "img_key": img_key
+            }
+            # the same statement again replaces the older copy
+            self.results = [r for r in self.results if _sql_key(r["sql"]) != _sql_key(sql)] + [entry]
+            del self.results[:-KEEP_RESULTS]
+            return entry
+
+    def find_result(self, sql):
+        """Stored result of an identical statement, or None."""
+        with self.lock:
+            for r in reversed(self.results):
+                if _sql_key(r["sql"]) == _sql_key(sql):
+                    return r
+        return None
+
+
+class SessionStore:
+    def __init__(self, ttl=SESSION_TTL_S, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()      # id -> Session, least recently used first
+        self._lock = threading.Lock()
+
+    def get(self, sid=None):
+        """Session for sid; a new one (with a new id) when sid is missing, unknown or expired."""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(sid) if sid else None
+            if session is None or now - session.last_used > self.ttl:
+                session = Session(secrets.token_hex(16))
+                self._sessions[session.id] = session
+            session.last_used = now
+            self._sessions.move_to_end(session.id)
+            while self._sessions:
+                oldest = next(iter(self._sessions.values()))
+                if len(self._sessions) <= self.max_sessions and now - oldest.last_used <= self.ttl:
+                    break
+                self._sessions.popitem(last=False)
+            return session
+
+    def peek(self, sid):
+        """Session for sid without touching it, or None."""
+        with self._lock:
+            return self._sessions.get(sid) if sid else None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+# ---------- EARLIER RESULTS AS TABLES ----------
+def _unique(columns):
+    """Column names made unique case-insensitively (a result can have two "temp" columns)."""
+    names = []
+    for c in columns:
+        name, n = str(c), 1
+        while name.lower() in (x.lower() for x in names):
+            n += 1
+            name = f"{c}_{n}"
+        names.append(name)
+    return names
+
+
+def load_results(conn, results):
+    """Make every stored result a table on conn: TEMP tables on SQLite (before it is made
+    read-only), registered DataFrames on DuckDB."""
+    if not isinstance(conn, sqlite3.Connection):
+        import pandas as pd
+        for r in results:
+            conn.register(r["name"], pd.DataFrame(r["rows"], columns=_unique(r["columns"])))
+        return
+    conn.execute("PRAGMA temp_store = MEMORY")
+    for r in results:
+        names = _unique(r["columns"])
+        cols = ", ".join('"' + n.replace('"', '""') + '"' for n in names)
+        conn.execute(f'DROP TABLE IF EXISTS temp."{r["name"]}"')
+        conn.execute(f'CREATE TEMP TABLE "{r["name"]}" ({cols})')
+        conn.executemany(f'INSERT INTO temp."{r["name"]}" VALUES ({", ".join("?" * len(names))})', r["rows"])
+    conn.commit()
+
+
+def describe_results(results):
+    """One line per stored result for the SQL agent's prompt."""
+    return "\n".join(
+        f'{r["name"]}({", ".join(map(str, r["columns"]))}) -- {len(r["rows"])} rows for "{r["query"]}"'
+        for r in results
+    )
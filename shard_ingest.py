@@ -0,0 +1,313 @@
+"""Sharded ingest: parallel shard databases merged into one deterministic file.
+
+The file list is partitioned by file-name hash or by float directory; each
+worker (a local process, or another machine given its --shard/--of) runs the
+normal ingest into its own shard database. merge() then combines any
+number of shards with ATTACH and INSERT ... SELECT. An existing output
+database is always one of the sources, so its profiles are kept and the
+shards are appended to them, as with parse_argo_folder.py:
+
+  1. every source profile gets a sort key, and new Data ids are its rank,
+     so ids do not depend on which worker read which file;
+  2. rows are copied into an unindexed staging file with Data and
+     Observation ids remapped (Trajectory/ProfileFeatures, computed by the
+     workers, follow their data_id);
+  3. the output is written from the staging tables in id order, then every
+     index and the Region lookup are built once.
+
+Given the same input profiles and the same SQLite version, the merged file
+is byte-for-byte identical however the files were split. Ids are always
+reassigned, including those of an existing database merged into the
+output, so ids saved elsewhere (e.g. in earlier results) do not carry over.
+
+    python shard_ingest.py run --workers 8 --out app.db argo_data
+    python shard_ingest.py shard --shard 3 --of 16 --out shard-03.db argo_data   # on node 3
+    python shard_ingest.py merge app.db shard-*.db
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from sqlalchemy.dialects import sqlite as sqlite_dialect
+from sqlalchemy.schema import CreateIndex, CreateTable
+
+import regions
+from parse_argo_folder import ARGO_DIR, MAX_CHUNK_MB, Base, ingest_files
+
+WORKERS = int(os.getenv("ARGO_WORKERS", os.cpu_count() or 1))
+SHARD_DIR = Path(os.getenv("ARGO_SHARD_DIR", "shards"))
+# Data order of the merged file; ties (identical metadata) fall through to the per-profile
+# summaries, then to the source order
+SORT_KEY = ("platform_number", "cycle_num", "juld", "data_mode", "latitude", "longitude",
+            "n_levels", "min_pressure", "max_pressure", "surface_temp", "surface_psal", "n_obs")
+TABLES = ("Data", "Observation", "Trajectory", "ProfileFeatures")   # Region is rebuilt from regions.json
+
+# ---------- PARTITIONING ----------
+def partition(files, n, by="hash"):
+    """Split files into n lists.
+
+    "hash" assigns each file by a hash of its name, so a file lands on the
+    same shard wherever it is stored; "dir" keeps each directory (one float
+    in the GDAC layout) together, largest directories first onto the
+    least loaded shard.
+    """
+    parts = [[] for _ in range(n)]
+    if by == "hash":
+        for f in sorted(files, key=str):
+            h = int.from_bytes(hashlib.sha1(Path(f).name.encode()).digest()[:8], "big")
+            parts[h % n].append(f)
+    elif by == "dir":
+        groups = {}
+        for f in sorted(files, key=str):
+            groups.setdefault(str(Path(f).parent), []).append(f)
+        for _, group in sorted(groups.items(), key=lambda kv: (-len(kv[1]), kv[0])):
+            min(parts, key=len).extend(group)
+    else:
+        raise ValueError(f"unknown partitioning {by!r}, use 'hash' or 'dir'")
+    return parts
+
+
+def _ingest_shard(job):
+    files, path, max_chunk_mb = job
+    return ingest_files(files, f"sqlite:///{path}", max_chunk_mb=max_chunk_mb)
+
+
+def ingest_shards(files, n, shard_dir=SHARD_DIR, by="hash", max_chunk_mb=MAX_CHUNK_MB):
+    """Ingest files into n shard databases with one process each; returns the shard paths."""
+    shard_dir = Path(shard_dir)
+    shard_dir.mkdir(parents=True, exist_ok=True)
+    jobs = []
+    for k, part in enumerate(partition(files, n, by)):
+        path = shard_dir / f"shard-{k:03d}.db"
+        for stale in (path, Path(f"{path}-wal"), Path(f"{path}-shm")):
+            stale.unlink(missing_ok=True)
+        if part:
+            jobs.append((part, path, max_chunk_mb))
+    with ProcessPoolExecutor(max_workers=min(n, len(jobs)) or 1) as pool:
+        for (part, path, _), total in zip(jobs, pool.map(_ingest_shard, jobs)):
+            print(f"{path}: {len(part)} files, {total} observations")
+    return [path for _, path, _ in jobs]
+
+# ---------- MERGE ----------
+def _ddl(element):
+    return str(element.compile(dialect=sqlite_dialect.dialect())).strip()
+
+
+def _create_table(conn, table, schema="main"):
+    conn.execute(_ddl(CreateTable(table)).replace("CREATE TABLE ", f"CREATE TABLE {schema}.", 1))
+
+
+def _columns(conn, schema, table):
+    return [r[1] for r in conn.execute(f'PRAGMA "{schema}".table_info("{table}")')]
+
+
+def _select_list(target, source, remap):
+    """Expressions for target columns: remapped ids, source columns, NULL where a shard lacks one."""
+    return ", ".join(remap.get(c, f's."{c}"' if c in source else "NULL") for c in target)
+
+
+def _check_layout(path):
+    """Raise ValueError unless path holds Data and Observation as tables (not the compact views)."""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        kinds = dict(conn.execute("SELECT name, type FROM sqlite_master WHERE name IN ('Data', 'Observation')"))
+    finally:
+        conn.close()
+    if kinds != {"Data": "table", "Observation": "table"}:
+        raise ValueError(f"{path} is not in the ingest layout (compact stores cannot be merged)")
+
+
+def _lock(out):
+    """Connection holding out for the merge: WAL folded back into the file, other writers shut out.
+
+    Leaving WAL mode needs the only connection to the file, so an out that
+    is open elsewhere raises instead of losing frames not yet checkpointed.
+    """
+    guard = sqlite3.connect(out, isolation_level=None, timeout=30)
+    try:
+        if guard.execute("PRAGMA journal_mode = DELETE").fetchone()[0].lower() != "delete":
+            raise sqlite3.OperationalError("could not leave WAL mode")
+        # locks, once taken, are kept until close; readers continue until the final swap
+        guard.execute("PRAGMA locking_mode = EXCLUSIVE")
+        guard.execute("BEGIN IMMEDIATE")
+    except sqlite3.OperationalError as e:
+        guard.close()
+        raise RuntimeError(f"{out} is in use ({e}); stop the app or ingest using it and merge again") from e
+    return guard
+
+
+def merge(sources, out):
+    """Merge shard databases (ingest layout) into out; returns the profile count.
+
+    sources are read only. An existing out is merged in as one more source
+    (listing it in sources too is fine), then replaced at the end; it must
+    be in the ingest layout and not open elsewhere, and it stays locked
+    against writers until the swap. Every Data and Observation id is
+    reassigned.
+    """
+    out = Path(out)
+    sources = list(dict.fromkeys(str(s) for s in sources))
+    if out.exists() and all(Path(s).resolve() != out.resolve() for s in sources):
+        sources.insert(0, str(out))
+    for path in sources + ([str(out)] if out.exists() else []):
+        _check_layout(path)
+    build = Path(f"{out}.merging")
+    stage = Path(f"{out}.stage")
+    for p in (build, stage):
+        p.unlink(missing_ok=True)
+    guard = _lock(out) if out.exists() else None
+    conn = sqlite3.connect(build, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")
+        conn.execute("PRAGMA synchronous = OFF")
+        conn.execute("ATTACH DATABASE ? AS stage", (str(stage),))
+        conn.execute("PRAGMA stage.journal_mode = OFF")
+        tables = {name: Base.metadata.tables[name] for name in TABLES}
+        for table in tables.values():
+            _create_table(conn, table, "stage")
+        target = {name: _columns(conn, "stage", name) for name in TABLES}
+
+        # 1. sort keys of every source profile -> new Data id and first Observation id
+        conn.execute(f"CREATE TEMP TABLE keys (src INTEGER, old_id INTEGER, {', '.join(SORT_KEY)})")
+        for i, path in enumerate(sources):
+            conn.execute("ATTACH DATABASE ? AS src", (path,))
+            # databases from before the Trajectory table sort on metadata alone
+            trajectory = "src.Trajectory" if _columns(conn, "src", "Trajectory") else \
+                "(SELECT " + ", ".join(f"NULL AS {c}" for c in ("data_id",) + SORT_KEY[6:-1]) + ")"
+            conn.execute(f"""
+                INSERT INTO temp.keys
+                SELECT {i}, d.id, d.platform_number, d.cycle_num, d.juld, d.data_mode, d.latitude, d.longitude,
+                       t.n_levels, t.min_pressure, t.max_pressure, t.surface_temp, t.surface_psal, coalesce(c.n, 0)
+                FROM src.Data d
+                LEFT JOIN {trajectory} t ON t.data_id = d.id
+                LEFT JOIN (SELECT data_id, count(*) AS n FROM src.Observation GROUP BY data_id) c ON c.data_id = d.id
+            """)
+            conn.execute("DETACH DATABASE src")
+        conn.execute(f"""
+            CREATE TEMP TABLE idmap AS
+            SELECT src, old_id, new_id,
+                   coalesce(sum(n_obs) OVER (ORDER BY new_id ROWS BETWEEN UNBOUNDED PRECEDING AND 1 PRECEDING), 0)
+                       AS obs_base
+            FROM (SELECT src, old_id, n_obs, row_number() OVER (ORDER BY {', '.join(SORT_KEY)}, src, old_id) AS new_id
+                  FROM temp.keys)
+        """)
+        conn.execute("CREATE UNIQUE INDEX temp.ix_idmap ON idmap (src, old_id)")
+        conn.execute("DROP TABLE temp.keys")
+
+        # 2. remapped copies into the unindexed staging tables
+        for i, path in enumerate(sources):
+            conn.execute("ATTACH DATABASE ? AS src", (path,))
+            conn.execute("BEGIN")
+            for name in TABLES:
+                source = set(_columns(conn, "src", name))
+                if not source:
+                    continue
+                if name == "Data":
+                    remap, key = {"id": "m.new_id"}, "id"
+                elif name == "Observation":
+                    remap = {"id": "m.obs_base + row_number() OVER (PARTITION BY s.data_id ORDER BY s.id)",
+                             "data_id": "m.new_id"}
+                    key = "data_id"
+                else:
+                    remap, key = {"data_id": "m.new_id"}, "data_id"
+                cols = ", ".join(f'"{c}"' for c in target[name])
+                conn.execute(f"""
+                    INSERT INTO stage."{name}" ({cols})
+                    SELECT {_select_list(target[name], source, remap)}
+                    FROM src."{name}" AS s JOIN temp.idmap m ON m.src = {i} AND m.old_id = s.{key}
+                """)
+            conn.execute("COMMIT")
+            conn.execute("DETACH DATABASE src")
+            print(f"merged {path}")
+
+        # 3. output in id order, then indexes and lookups once
+        conn.execute("BEGIN")
+        for name, table in tables.items():
+            _create_table(conn, table)
+            pk = "id" if "id" in target[name] else "data_id"
+            conn.execute(f'INSERT INTO main."{name}" SELECT * FROM stage."{name}" ORDER BY "{pk}"')
+        conn.execute("COMMIT")
+        conn.execute("DETACH DATABASE stage")
+        conn.execute("BEGIN")
+        for table in tables.values():
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                conn.execute(_ddl(CreateIndex(index)))
+        _create_table(conn, Base.metadata.tables["Region"])
+        conn.executemany('INSERT INTO "Region" (code, name, basin_code) VALUES (?, ?, ?)', regions.region_table())
+        conn.execute("COMMIT")
+        profiles = conn.execute('SELECT count(*) FROM "Data"').fetchone()[0]
+    except BaseException:
+        if guard is not None:
+            guard.close()
+        raise
+    finally:
+        conn.close()
+        stage.unlink(missing_ok=True)
+    if guard is None:
+        # a WAL left without its database would be replayed into the new file
+        for suffix in ("-wal", "-shm"):
+            Path(f"{out}{suffix}").unlink(missing_ok=True)
+    else:
+        # a no-op write takes the exclusive lock (kept in exclusive locking mode) for the swap
+        guard.execute("PRAGMA user_version = " + str(guard.execute("PRAGMA user_version").fetchone()[0]))
+        guard.execute("COMMIT")
+    try:
+        os.replace(build, out)
+    finally:
+        if guard is not None:
+            guard.close()
+    return profiles
+
+# ---------- MAIN ----------
+def _files(paths):
+    files = []
+    for p in map(Path, paths or [ARGO_DIR]):
+        files += sorted(p.rglob("*.nc")) if p.is_dir() else [p]
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sharded Argo ingest and deterministic shard merge.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    run = sub.add_parser("run", help="ingest with local worker processes, then merge into --out (appending to it)")
+    run.add_argument("paths", nargs="*", help=f"files or folders of .nc files (default: {ARGO_DIR})")
+    run.add_argument("--workers", type=int, default=WORKERS)
+    run.add_argument("--out", default="app.db")
+    run.add_argument("--shard-dir", default=str(SHARD_DIR))
+    run.add_argument("--keep-shards", action="store_true")
+    shard = sub.add_parser("shard", help="ingest one shard of the file list (one node of a multi-machine run)")
+    shard.add_argument("paths", nargs="*", help=f"files or folders of .nc files (default: {ARGO_DIR})")
+    shard.add_argument("--shard", type=int, required=True, help="this shard's number, 0-based")
+    shard.add_argument("--of", type=int, required=True, help="total number of shards")
+    shard.add_argument("--out", required=True)
+    for p in (run, shard):
+        p.add_argument("--by", choices=["hash", "dir"], default="hash", help="partition by file-name hash or directory")
+        p.add_argument("--max-chunk-mb", type=float, default=MAX_CHUNK_MB)
+    mrg = sub.add_parser("merge", help="merge shard databases into out, keeping the profiles already in it "
+                                       "(ids are reassigned)")
+    mrg.add_argument("out", help="output database; an existing one is merged in as one more source")
+    mrg.add_argument("shards", nargs="+")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "shard":
+        part = partition(_files(args.paths), args.of, args.by)[args.shard]
+        total = ingest_files(part, f"sqlite:///{args.out}", max_chunk_mb=args.max_chunk_mb)
+        print(f"shard {args.shard}/{args.of}: {len(part)} files, {total} observations")
+    elif args.cmd == "merge":
+        print(f"{merge(args.shards, args.out)} profiles written to {args.out}")
+    else:
+        shards = ingest_shards(_files(args.paths), args.workers, args.shard_dir, args.by, args.max_chunk_mb)
+        print(f"{merge(shards, args.out)} profiles written to {args.out}")
+        if not args.keep_shards:
+            for path in shards:
+                Path(path).unlink(missing_ok=True)
+    print(f"done in {time.perf_counter() - t0:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""Validation of generated SQL before it runs, and the live schema for the SQL agent.
+
+validate() compiles a statement without executing it (EXPLAIN), rejects
+anything but a single statement, and installs an authorizer that only
+allows reads, so a bad DBM answer fails fast with SQLite's own error
+message, which the caller can feed back to the model for a repair.
+"""
+import re
+import sqlite3
+import threading
+
+# internals of the compact layout (compact_store), reachable through the Data/Observation views
+HIDDEN_TABLES = {"sqlite_sequence", "sqlite_stat1", "Profile", "ProfileText", "ProfileLevels", "Levels",
+                 "ObservationC", "DataMode", "PositionSystem"}
+ALLOWED_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION,
+                   getattr(sqlite3, "SQLITE_RECURSIVE", 33)}
+_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*|\s*```\s*$")
+
+
+class InvalidSQL(Exception):
+    pass
+
+# ---------- SCHEMA ----------
+_schema_cache = {}
+_schema_lock = threading.Lock()
+
+
+def schema_ddl(conn):
+    """CREATE TABLE-style listing of every queryable table and view, read from the database itself.
+
+    Cached per database file and schema_version, so it is rebuilt only after
+    a migration adds tables or columns.
+    """
+    path = conn.execute("PRAGMA database_list").fetchone()[2]
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    with _schema_lock:
+        hit = _schema_cache.get(path)
+        if hit is not None and hit[0] == version:
+            return hit[1]
+    blocks = []
+    names = conn.execute("SELECT name, type FROM sqlite_master WHERE type IN ('table', 'view') "
+                         "AND name NOT LIKE 'sqlite_%' ORDER BY rowid").fetchall()
+    for name, kind in names:
+        if name in HIDDEN_TABLES:
+            continue
+        cols = []
+        for _, col, decl, _, _, pk in conn.execute(f'PRAGMA table_info("{name}")'):
+            cols.append(f"{col} {decl}".rstrip() + (" PRIMARY KEY" if pk == 1 else ""))
+        blocks.append(f"CREATE TABLE {name} (\n" + ",\n".join(cols) + ");")
+    ddl = "\n\n".join(blocks)
+    with _schema_lock:
+        _schema_cache[path] = (version, ddl)
+    return ddl
+
+# ---------- VALIDATION ----------
+def _authorize(action, arg1, arg2, dbname, source):
+    return sqlite3.SQLITE_OK if action in ALLOWED_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def read_only(conn):
+    """Restrict a connection to reads: authorizer for every statement, query_only as a backstop."""
+    conn.set_authorizer(None)
+    conn.execute("PRAGMA query_only = ON")
+    conn.set_authorizer(_authorize)
+    return conn
+
+
+def clean(sql):
+    """Strip markdown fences and surrounding whitespace/semicolons from a model answer."""
+    return _FENCE.sub("", str(sql)).strip().rstrip(";").strip()
+
+
+def validate(conn, sql):
+    """Return the cleaned statement if it compiles as a single read-only query, else raise InvalidSQL.
+
+    Nothing is executed: EXPLAIN only prepares the statement, which resolves
+    every table, column and function and runs the authorizer.
+    """
+    sql = clean(sql)
+    if not sql:
+        raise InvalidSQL("empty statement")
+    if _more_than_one(sql):
+        raise InvalidSQL("more than one SQL statement; write a single SELECT")
+    read_only(conn)
+    try:
+        conn.execute("EXPLAIN " + sql).fetchall()
+    except (sqlite3.DatabaseError, sqlite3.Warning) as e:
+        msg = str(e)
+        if "not authorized" in msg:
+            msg = "only read-only SELECT queries are allowed"
+        raise InvalidSQL(msg) from e
+    return sql
+
+
+def _more_than_one(sql):
+    """True if sql holds a statement after its first complete one (quotes and comments respected)."""
+    i, n = 0, len(sql)
+    while i < n:
+        c = sql[i]
+        if c in "'\"`[":
+            close = "]" if c == "[" else c
+            j = sql.find(close, i + 1)
+            i = n if j < 0 else j + 1
+        elif sql.startswith("--", i):
+            j = sql.find("\n", i)
+            i = n if j < 0 else j + 1
+        elif sql.startswith("/*", i):
+            j = sql.find("*/", i + 2)
+            i = n if j < 0 else j + 2
+        elif c == ";":
+            return bool(sql[i + 1:].strip())
+        else:
+            i += 1
+    return False
+
+
+def repair_prompt(question, sql, error):
+    """Follow-up for the SQL agent after its statement failed validation or execution."""
+    return (f"{question}\n\nYour previous SQL:\n{sql}\n\nfailed with: {error}\n"
+            "Return only a corrected single SELECT statement for the schema above.")
@@ -0,0 +1,217 @@
+"""Synthetic Argo profile NetCDF generator.
+
+Writes files with the Argo profile layout (N_PROF x N_LEVELS core and BGC
+variables, per-level QC flags, adjusted fields, N_CALIB calibration text and
+history) filled with plausible ocean values. Used as a fixture and by
+bench_ingest.py.
+
+    python synth_argo.py out_dir --files 20 --n-prof 1 --n-levels 100
+"""
+import argparse
+import os
+from pathlib import Path
+
+import numpy as np
+
+FILL_FLOAT = np.float32(99999.0)
+FILL_DOUBLE = 999999.0
+
+# Default QC flag distribution for measured levels.
+DEFAULT_QC = {"1": 0.90, "2": 0.04, "3": 0.02, "4": 0.02, "8": 0.01, "0": 0.01}
+
+STRING_DIMS = {"STRING2": 2, "STRING4": 4, "STRING8": 8, "STRING16": 16,
+               "STRING32": 32, "STRING64": 64, "STRING256": 256, "DATE_TIME": 14}
+
+DATA_CENTRES = ["AO", "IF", "CS", "IN", "JA", "BO", "ME", "KO"]
+PLATFORM_TYPES = ["APEX", "ARVOR", "NAVIS_A", "SOLO_II", "PROVOR_III"]
+PROJECTS = ["ARGO", "US ARGO PROJECT", "ARGO INDIA", "EURO-ARGO", "ARGO AUSTRALIA"]
+
+
+def _surface_temp(lat):
+    return np.clip(29.0 - 0.45 * np.abs(lat) - 0.002 * lat ** 2, -1.5, 30.0)
+
+
+def _profile_values(param, pres, lat, rng):
+    """Plausible values for one parameter on (n_prof, n_levels) pressures."""
+    lat = lat[:, None]
+    if param == "PRES":
+        return pres
+    if param == "TEMP":
+        sst = _surface_temp(lat)
+        thermo = rng.uniform(80, 250, size=lat.shape)
+        deep = 2.0 + 0.5 * rng.standard_normal(lat.shape)
+        t = deep + (sst - deep) * np.exp(-np.maximum(pres - 20, 0) / thermo)
+        return t + 0.05 * rng.standard_normal(pres.shape)
+    if param == "PSAL":
+        s_surf = 35.0 + 1.2 * np.cos(np.radians(lat * 2.5)) + 0.2 * rng.standard_normal(lat.shape)
+        return 34.7 + (s_surf - 34.7) * np.exp(-pres / 600) + 0.01 * rng.standard_normal(pres.shape)
+    if param == "DOXY":
+        return 220 - 150 * np.exp(-((pres - 700) / 400) ** 2) + 5 * rng.standard_normal(pres.shape)
+    if param == "CHLA":
+        peak = rng.uniform(40, 120, size=lat.shape)
+        return np.maximum(0.02, 0.8 * np.exp(-((pres - peak) / 30) ** 2)) + 0.01 * rng.random(pres.shape)
+    if param == "NITRATE":
+        return 35 * (1 - np.exp(-pres / 400)) + 0.3 * rng.standard_normal(pres.shape)
+    # Unknown parameters still get a smooth, finite signal.
+    return 1 + np.log1p(pres) + 0.01 * rng.standard_normal(pres.shape)
+
+
+def _qc(shape, dist, rng):
+    flags = np.array(list(dist.keys()), dtype="S1")
+    probs = np.array(list(dist.values()), dtype=float)
+    return rng.choice(flags, size=shape, p=probs / probs.sum())
+
+
+def _chars(values, width):
+    """List of strings -> (len, width) S1 array, blank padded."""
+    arr = np.array([str(v).ljust(width)[:width].encode("ascii") for v in np.ravel(values)], dtype=f"S{width}")
+    return arr.view("S1").reshape(np.shape(values) + (width,))
+
+
+def make_profile_file(path, n_prof=1, n_levels=70, n_calib=1, params=("PRES", "TEMP", "PSAL"),
+                      qc_dist=None, adjusted_qc_dist=None, data_mode="R", seed=0,
+                      fmt="NETCDF3_CLASSIC", upper_case=False, platform_number=None, cycle=1):
+    """Write one synthetic Argo profile file and return its path.
+
+    data_mode is 'R', 'A', 'D' or 'mixed'. Profiles get a random number of
+    valid levels (at least half of n_levels); the rest are fill values with
+    blank QC, like real files. Variable names are lower-case as in the NCEI
+    GADR copies unless upper_case is set.
+    """
+    from netCDF4 import Dataset
+
+    rng = np.random.default_rng(seed)
+    qc_dist = qc_dist or DEFAULT_QC
+    adjusted_qc_dist = adjusted_qc_dist or qc_dist
+    name = (lambda n: n.upper()) if upper_case else (lambda n: n.lower())
+    n_param = len(params)
+    platform_number = platform_number or int(rng.integers(1_900_000, 7_000_000))
+
+    lat = rng.uniform(-60, 60, n_prof)
+    lon = rng.uniform(-180, 180, n_prof)
+    juld = rng.uniform(18_000, 27_000, n_prof)     # days since 1950, ~1999-2023
+    modes = (rng.choice(list("RAD"), n_prof) if data_mode == "mixed" else np.full(n_prof, data_mode))
+
+    n_valid = rng.integers(max(1, n_levels // 2), n_levels + 1, n_prof)
+    valid = np.arange(n_levels)[None, :] < n_valid[:, None]
+    step = np.sort(rng.uniform(1, 2 * 2000 / n_levels, (n_prof, n_levels)), axis=1)
+    pres = np.cumsum(step, axis=1) * (2000 / np.maximum(np.cumsum(step, axis=1)[:, -1:], 1))
+
+    ds = Dataset(path, "w", format=fmt)
+    try:
+        for dim, size in STRING_DIMS.items():
+            ds.createDimension(dim, size)
+        ds.createDimension("N_PROF", n_prof)
+        ds.createDimension("N_PARAM", n_param)
+        ds.createDimension("N_LEVELS", n_levels)
+        ds.createDimension("N_CALIB", n_calib)
+        ds.createDimension("N_HISTORY", None)
+        ds.setncattr("title", "Argo float vertical profile")
+        ds.setncattr("Conventions", "Argo-3.1 CF-1.6")
+        ds.setncattr("featureType", "trajectoryProfile")
+
+        def char_var(var, dims, values):
+            v = ds.createVariable(name(var), "S1", dims)
+            v[:] = _chars(values, STRING_DIMS[dims[-1]])
+
+        char_var("DATA_TYPE", ("STRING16",), "Argo profile")
+        char_var("FORMAT_VERSION", ("STRING4",), "3.1")
+        char_var("REFERENCE_DATE_TIME", ("DATE_TIME",), "19500101000000")
+        char_var("PLATFORM_NUMBER", ("N_PROF", "STRING8"), [platform_number] * n_prof)
+        char_var("PROJECT_NAME", ("N_PROF", "STRING64"), rng.choice(PROJECTS, n_prof))
+        char_var("PI_NAME", ("N_PROF", "STRING64"), ["SYNTHETIC PI"] * n_prof)
+        char_var("STATION_PARAMETERS", ("N_PROF", "N_PARAM", "STRING16"), [list(params)] * n_prof)
+        char_var("DATA_CENTRE", ("N_PROF", "STRING2"), rng.choice(DATA_CENTRES, n_prof))
+        char_var("PLATFORM_TYPE", ("N_PROF", "STRING32"), rng.choice(PLATFORM_TYPES, n_prof))
+        char_var("FLOAT_SERIAL_NO", ("N_PROF", "STRING32"), rng.integers(1000, 9999, n_prof))
+        char_var("FIRMWARE_VERSION", ("N_PROF", "STRING32"), rng.integers(100, 999, n_prof))
+        char_var("POSITIONING_SYSTEM", ("N_PROF", "STRING8"), rng.choice(["GPS", "ARGOS"], n_prof))
+
+        v = ds.createVariable(name("CYCLE_NUMBER"), "i4", ("N_PROF",), fill_value=np.int32(99999))
+        v[:] = cycle + np.arange(n_prof)
+        for var, values in (("DATA_MODE", modes), ("DIRECTION", np.full(n_prof, "A"))):
+            v = ds.createVariable(name(var), "S1", ("N_PROF",))
+            v[:] = np.array(values, dtype="S1")
+        v = ds.createVariable(name("JULD"), "f8", ("N_PROF",), fill_value=FILL_DOUBLE)
+        v.units = "days since 1950-01-01 00:00:00 UTC"
+        v[:] = juld
+        for var, values in (("LATITUDE", lat), ("LONGITUDE", lon)):
+            v = ds.createVariable(name(var), "f8", ("N_PROF",), fill_value=FILL_DOUBLE)
+            v[:] = values
+
+        for param in params:
+            raw = np.where(valid, _profile_values(param, pres, lat, rng), FILL_FLOAT).astype("f4")
+            raw_qc = np.where(valid, _qc(raw.shape, qc_dist, rng), b" ")
+            has_adj = np.isin(modes, ["A", "D"])[:, None] & valid
+            adj = np.where(has_adj, raw + rng.normal(0, 0.01, raw.shape), FILL_FLOAT).astype("f4")
+            adj_qc = np.where(has_adj, _qc(raw.shape, adjusted_qc_dist, rng), b" ")
+            for suffix, values in (("", raw), ("_ADJUSTED", adj)):
+                v = ds.createVariable(name(param + suffix), "f4", ("N_PROF", "N_LEVELS"), fill_value=FILL_FLOAT)
+                v[:] = values
+            for suffix, values in (("_QC", raw_qc), ("_ADJUSTED_QC", adj_qc)):
+                v = ds.createVariable(name(param + suffix), "S1", ("N_PROF", "N_LEVELS"))
+                v[:] = values.astype("S1")
+            v = ds.createVariable(name(param + "_ADJUSTED_ERROR"), "f4", ("N_PROF", "N_LEVELS"), fill_value=FILL_FLOAT)
+            v[:] = np.where(has_adj, 0.01, FILL_FLOAT)
+
+        calib_shape = (n_prof, n_calib, n_param)
+        char_var("PARAMETER", ("N_PROF", "N_CALIB", "N_PARAM", "STRING16"),
+                 np.broadcast_to(np.array(params), calib_shape))
+        char_var("SCIENTIFIC_CALIB_EQUATION", ("N_PROF", "N_CALIB", "N_PARAM", "STRING256"),
+                 np.broadcast_to(np.array([f"{p}_ADJUSTED = {p}" for p in params]), calib_shape))
+        char_var("SCIENTIFIC_CALIB_COEFFICIENT", ("N_PROF", "N_CALIB", "N_PARAM", "STRING256"),
+                 np.full(calib_shape, "r=1.0000"))
+        char_var("SCIENTIFIC_CALIB_COMMENT", ("N_PROF", "N_CALIB", "N_PARAM", "STRING256"),
+                 np.full(calib_shape, "No adjustment performed"))
+        v = ds.createVariable(name("HISTORY_SOFTWARE"), "S1", ("N_HISTORY", "N_PROF", "STRING4"))
+        v[0:1] = _chars(np.full((1, n_prof), "SYN1"), 4)
+    finally:
+        ds.close()
+    return path
+
+
+def make_dataset(out_dir, n_files, seed=0, **kwargs):
+    """Write n_files synthetic profile files named like GDAC per-cycle files."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for i in range(n_files):
+        mode = kwargs.get("data_mode", "R")
+        prefix = "D" if mode == "D" else "R"
+        platform = 1_900_000 + (seed * 7919 + i // 10) % 5_000_000
+        path = out_dir / f"{prefix}{platform}_{i % 10 + 1:03d}.nc"
+        paths.append(make_profile_file(path, seed=seed * 100_003 + i,
+                                       platform_number=platform, cycle=i % 10 + 1, **kwargs))
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Write synthetic Argo profile NetCDF files.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--files", type=int, default=10)
+    parser.add_argument("--n-prof", type=int, default=1)
+    parser.add_argument("--n-levels", type=int, default=70)
+    parser.add_argument("--n-calib", type=int, default=1)
+    parser.add_argument("--params", default="PRES,TEMP,PSAL", help="comma separated, e.g. PRES,TEMP,PSAL,DOXY")
+    parser.add_argument("--data-mode", default="R", choices=["R", "A", "D", "mixed"])
+    parser.add_argument("--bad-qc", type=float, default=None,
+                        help="fraction of levels flagged 3/4; the rest are 1/2")
+    parser.add_argument("--format", default="NETCDF3_CLASSIC", choices=["NETCDF3_CLASSIC", "NETCDF3_64BIT_OFFSET", "NETCDF4"])
+    parser.add_argument("--upper-case", action="store_true", help="GDAC style upper-case variable names")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    qc = None
+    if args.bad_qc is not None:
+        good = 1 - args.bad_qc
+        qc = {"1": good * 0.95, "2": good * 0.05, "3": args.bad_qc / 2, "4": args.bad_qc / 2}
+    paths = make_dataset(args.out_dir, args.files, seed=args.seed, n_prof=args.n_prof,
+                         n_levels=args.n_levels, n_calib=args.n_calib,
+                         params=tuple(args.params.split(",")), qc_dist=qc,
+                         data_mode=args.data_mode, fmt=args.format, upper_case=args.upper_case)
+    size = sum(os.path.getsize(p) for p in paths)
+    print(f"Wrote {len(paths)} files ({size / 1e6:.1f} MB) to {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
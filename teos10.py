@@ -0,0 +1,42 @@
+"""TEOS-10 derived variables for Observation levels.
+
+Absolute salinity, conservative and potential temperature, in-situ density
+and sigma0 are computed with gsw in one vectorized call per batch of
+levels, from the QC-merged pressure/temp/psal and the profile position.
+gsw is optional: without it the columns stay NULL until a backfill runs
+in an environment that has it.
+"""
+import numpy as np
+
+# Observation column -> units
+DERIVED = {
+    "absolute_salinity": "g/kg",
+    "conservative_temp": "degree_Celsius",
+    "potential_temp": "degree_Celsius",      # referenced to 0 dbar
+    "density": "kg/m3",                      # in-situ
+    "sigma0": "kg/m3",                       # potential density anomaly at 0 dbar
+}
+
+try:
+    import gsw
+except ImportError:     # optional dependency
+    gsw = None
+
+
+def available():
+    return gsw is not None
+
+
+def derive(pressure, temp, psal, latitude, longitude):
+    """1-D (or broadcastable) level arrays -> dict of DERIVED column -> float64 array (NaN where undefined)."""
+    p, t, sp, lat, lon = (np.asarray(a, dtype=np.float64) for a in (pressure, temp, psal, latitude, longitude))
+    with np.errstate(invalid="ignore"):
+        sa = gsw.SA_from_SP(sp, p, lon, lat)
+        ct = gsw.CT_from_t(sa, t, p)
+        return {
+            "absolute_salinity": sa,
+            "conservative_temp": ct,
+            "potential_temp": gsw.pt0_from_t(sa, t, p),
+            "density": gsw.rho(sa, ct, p),
+            "sigma0": gsw.sigma0(sa, ct),
+        }
@@ -0,0 +1,22 @@
+import regions
+
+PACIFIC = 2
+CARIBBEAN = 105
+
+
+def test_central_america_pacific_side_is_pacific():
+    # off Guatemala / El Salvador, Gulf of Fonseca, Nicaragua, Papagayo, Costa Rica, Panama
+    lat = [12, 13.2, 13, 10.5, 10, 8.5, 7.5]
+    lon = [-88, -87.6, -87.8, -86, -86.5, -83, -80]
+    basin, region = regions.classify(lat, lon)
+    assert basin.tolist() == [PACIFIC] * len(lat)
+    assert region.tolist() == [PACIFIC] * len(lat)
+
+
+def test_central_america_caribbean_side_is_caribbean():
+    # off Honduras, Nicaragua, Costa Rica, Panama and the open Caribbean
+    lat = [16.5, 12, 10, 9.5, 15]
+    lon = [-86.5, -83, -82.5, -80, -80]
+    basin, region = regions.classify(lat, lon)
+    assert basin.tolist() == [1] * len(lat)
+    assert region.tolist() == [CARIBBEAN] * len(lat)
@@ -0,0 +1,213 @@
+"""Local memory-mapped vector index for the ARGO knowledge path.
+
+Documents are split into paragraph chunks, embedded, clustered into IVF
+lists and stored as plain .npy files. At query time the embedding matrix is
+memory-mapped, the query is scored against the list centroids and only the
+closest lists are scanned with one batched dot product each.
+
+Build offline:
+    python vector_index.py build knowledge/ --out vector_index
+Query:
+    python vector_index.py query "What does QC flag 4 mean?"
+"""
+import argparse
+import json
+import os
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+INDEX_DIR = Path(os.getenv("VECTOR_INDEX_DIR", "vector_index"))
+EMBED_MODEL = os.getenv("VECTOR_EMBED_MODEL")   # local sentence-transformers model path/name
+EMBED_DIM = 384
+CHUNK_CHARS = 800
+NPROBE = int(os.getenv("VECTOR_NPROBE", 4))
+
+STOPWORDS = frozenset(
+    "a an and are as at be by do does for from how in is it of on or the this to was what when where which who why with".split()
+)
+
+# ---------- EMBEDDERS ----------
+class HashingEmbedder:
+    """Dependency-free embedder: signed feature hashing of word unigrams and bigrams.
+
+    Deterministic across processes (crc32, not hash()) so an index built on
+    one machine can be queried on another.
+    """
+    name = "hashing"
+
+    def __init__(self, dim=EMBED_DIM):
+        self.dim = dim
+
+    def _tokens(self, text):
+        words = [w for w in re.findall(r"[a-z0-9]+", text.lower()) if w not in STOPWORDS]
+        return words + [a + " " + b for a, b in zip(words, words[1:])]
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for i, text in enumerate(texts):
+            for tok in self._tokens(text):
+                h = zlib.crc32(tok.encode("utf-8"))
+                out[i, h % self.dim] += 1.0 if (h >> 31) & 1 else -1.0
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        return out / np.maximum(norms, 1e-12)
+
+
+class SentenceTransformerEmbedder:
+    def __init__(self, model_name):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.name = f"st:{model_name}"
+        self.dim = self.model.get_sentence_embedding_dimension()
+
+    def embed(self, texts):
+        return np.asarray(
+            self.model.encode(list(texts), batch_size=64, normalize_embeddings=True),
+            dtype=np.float32,
+        )
+
+
+def make_embedder(name=None):
+    name = name or (f"st:{EMBED_MODEL}" if EMBED_MODEL else "hashing")
+    if name.startswith("st:"):
+        return SentenceTransformerEmbedder(name[3:])
+    return HashingEmbedder()
+
+# ---------- BUILD ----------
+def chunk_text(text, max_chars=CHUNK_CHARS):
+    """Split on markdown headings, then pack paragraphs into chunks of at most max_chars."""
+    chunks = []
+    for section in re.split(r"\n(?=#)", text):
+        cur = ""
+        for para in re.split(r"\n\s*\n", section):
+            para = " ".join(para.split())
+            if not para:
+                continue
+            if cur and len(cur) + len(para) + 1 > max_chars:
+                chunks.append(cur)
+                cur = ""
+            cur = f"{cur} {para}".strip()
+        if cur:
+            chunks.append(cur)
+    return chunks
+
+
+def kmeans(x, k, iters=10, seed=0):
+    rng = np.random.default_rng(seed)
+    centroids = x[rng.choice(len(x), size=k, replace=False)].copy()
+    for _ in range(iters):
+        assign = np.argmax(x @ centroids.T, axis=1)
+        for c in range(k):
+            members = x[assign == c]
+            if len(members):
+                v = members.sum(axis=0)
+                centroids[c] = v / max(np.linalg.norm(v), 1e-12)
+    return centroids, np.argmax(x @ centroids.T, axis=1)
+
+
+def build_index(doc_dir, out_dir=INDEX_DIR, embedder=None, batch_size=256):
+    embedder = embedder or make_embedder()
+    docs = []
+    for path in sorted(Path(doc_dir).rglob("*")):
+        if path.suffix.lower() in (".md", ".txt"):
+            for chunk in chunk_text(path.read_text(encoding="utf-8")):
+                docs.append({"source": str(path.relative_to(doc_dir)), "text": chunk})
+    if not docs:
+        raise ValueError(f"No .md/.txt documents found in {doc_dir}")
+
+    emb = np.concatenate([
+        embedder.embed([d["text"] for d in docs[i:i + batch_size]])
+        for i in range(0, len(docs), batch_size)
+    ])
+    nlist = max(1, int(np.sqrt(len(docs))))
+    centroids, assign = kmeans(emb, nlist)
+
+    # Store vectors sorted by list so each IVF list is one contiguous slice.
+    order = np.argsort(assign, kind="stable")
+    offsets = np.searchsorted(assign[order], np.arange(nlist + 1))
+
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    np.save(out_dir / "embeddings.npy", emb[order])
+    np.save(out_dir / "centroids.npy", centroids.astype(np.float32))
+    np.save(out_dir / "offsets.npy", offsets.astype(np.int64))
+    with open(out_dir / "chunks.jsonl", "w", encoding="utf-8") as f:
+        for i in order:
+            f.write(json.dumps(docs[i]) + "\n")
+    with open(out_dir / "meta.json", "w") as f:
+        json.dump({"embedder": embedder.name, "dim": int(emb.shape[1]),
+                   "count": len(docs), "nlist": nlist}, f)
+    print(f"Indexed {len(docs)} chunks into {nlist} lists at {out_dir}")
+    return len(docs)
+
+# ---------- SEARCH ----------
+class VectorIndex:
+    def __init__(self, index_dir=INDEX_DIR):
+        index_dir = Path(index_dir)
+        with open(index_dir / "meta.json") as f:
+            self.meta = json.load(f)
+        self.embeddings = np.load(index_dir / "embeddings.npy", mmap_mode="r")
+        self.centroids = np.load(index_dir / "centroids.npy")
+        self.offsets = np.load(index_dir / "offsets.npy")
+        with open(index_dir / "chunks.jsonl", encoding="utf-8") as f:
+            self.chunks = [json.loads(line) for line in f]
+        self.embedder = make_embedder(self.meta["embedder"])
+
+    def search(self, queries, k=4, nprobe=NPROBE):
+        """Return, per query, a list of (score, chunk) for the k best chunks."""
+        single = isinstance(queries, str)
+        if single:
+            queries = [queries]
+        q = self.embedder.embed(queries)
+        probe = np.argsort(-(q @ self.centroids.T), axis=1)[:, :nprobe]
+        results = []
+        for qi in range(len(queries)):
+            spans = [(self.offsets[c], self.offsets[c + 1]) for c in probe[qi]]
+            ids = np.concatenate([np.arange(lo, hi) for lo, hi in spans])
+            if len(ids) == 0:
+                results.append([])
+                continue
+            # each probed list is a contiguous slice of the memory map
+            block = np.concatenate([self.embeddings[lo:hi] for lo, hi in spans])
+            scores = block @ q[qi]
+            top = np.argsort(-scores)[:k]
+            results.append([(float(scores[t]), self.chunks[ids[t]]) for t in top])
+        return results[0] if single else results
+
+
+_index = None
+
+def get_index():
+    """Load the index on first use; None if it has not been built."""
+    global _index
+    if _index is None and (INDEX_DIR / "meta.json").exists():
+        _index = VectorIndex(INDEX_DIR)
+    return _index
+
+# ---------- CLI ----------
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the local ARGO knowledge index.")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    b = sub.add_parser("build")
+    b.add_argument("doc_dir")
+    b.add_argument("--out", default=str(INDEX_DIR))
+    b.add_argument("--embedder", default=None, help="'hashing' or 'st:<model>'")
+    q = sub.add_parser("query")
+    q.add_argument("text")
+    q.add_argument("-k", type=int, default=4)
+    args = parser.parse_args()
+
+    if args.cmd == "build":
+        build_index(args.doc_dir, args.out, make_embedder(args.embedder))
+    else:
+        index = get_index()
+        if index is None:
+            print(f"No index at {INDEX_DIR}, run the build command first.")
+            return
+        for score, chunk in index.search(args.text, k=args.k):
+            print(f"{score:.3f}  [{chunk['source']}]  {chunk['text'][:120]}")
+
+if __name__ == "__main__":
+    main()